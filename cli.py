@@ -0,0 +1,208 @@
+import argparse
+import sys
+
+from pathlib import Path
+
+
+# Only the standard library is imported here: cplex, numpy and pandas are
+# imported by the commands that need them, so quick commands start fast.
+COMMANDS = ['solve', 'generate', 'validate', 'benchmark', 'verify']
+
+
+def solve(args) -> int:
+    import solver
+    from utils.instance_loader import InstanceValidationError
+
+    args.instance = Path(args.instance).resolve()
+    try:
+        return solver.main(args) or 0
+    except (InstanceValidationError, FileNotFoundError) as error:
+        print(error)
+        return 1
+
+
+def generate(args) -> int:
+    # Draws a random instance from a random configuration file and saves it
+    # as a regular instance file
+    from utils.field_service_class import FieldServiceManagementInstance
+
+    output = Path(args.output)
+    instance = FieldServiceManagementInstance(file=Path(args.config).resolve(),
+                                              data_path=output.parent, seed=args.seed)
+    if not instance.is_random:
+        print(f'{args.config} is not a random configuration ("is_random": true)')
+        return 1
+    output.parent.mkdir(parents=True, exist_ok=True)
+    instance.save_to_json(name=output.name)
+    print(f'Instance with {instance.number_of_orders} orders and '
+          f'{instance.number_of_workers} workers saved in {output}')
+    return 0
+
+
+def validate(args) -> int:
+    from utils.instance_loader import InstanceValidationError, read_problem_data
+
+    invalid = 0
+    for file_path in args.instances:
+        try:
+            data = read_problem_data(Path(file_path))
+        except (InstanceValidationError, OSError) as error:
+            invalid += 1
+            print(error)
+            continue
+        print(f'{file_path}: valid ({data["number_of_orders"]} orders, '
+              f'{data["number_of_workers"]} workers)')
+        if args.feasibility and not data.get('is_random'):
+            from utils.feasibility import check_feasibility
+            from utils.field_service_class import FieldServiceManagementInstance
+
+            instance = FieldServiceManagementInstance(file=Path(file_path).resolve())
+            check_feasibility(instance).print_report()
+    return 1 if invalid else 0
+
+
+def benchmark(args) -> int:
+    import srsly
+    import solver
+    from utils.instance_loader import InstanceValidationError
+
+    results = []
+    invalid = 0
+    for file_path in args.instances:
+        try:
+            result = solver.benchmark_instance(Path(file_path).resolve(),
+                                               two_stage=args.two_stage,
+                                               low_memory=args.low_memory,
+                                               time_limit=args.time_limit,
+                                               output_path=Path(args.output_dir))
+        except (InstanceValidationError, FileNotFoundError) as error:
+            invalid += 1
+            print(error)
+            continue
+        results.append(result)
+        objective = 'no solution' if result['objective'] is None \
+            else f'{result["objective"]:.1f}'
+        print(f'{file_path}: {result["orders"]} orders, {result["workers"]} workers, '
+              f'objective {objective} ({result["status"]})')
+        for phase in result['phases']:
+            print(f'    {phase["phase"]}: {phase["seconds"]:.2f}s, '
+                  f'peak {phase["peak_mb"]:.1f} MB')
+    if args.output:
+        srsly.write_json(args.output, results)
+    return 1 if invalid else 0
+
+
+def verify(args) -> int:
+    from utils.field_service_class import FieldServiceManagementInstance
+    from utils.verifier import (VerificationReport, diff_schedules, print_diff,
+                                read_schedule_pair, verify_schedule)
+
+    data = FieldServiceManagementInstance(file=Path(args.instance).resolve())
+    report = VerificationReport()
+    schedule = read_schedule_pair(data, Path(args.results), report)
+    verify_schedule(data, schedule, report).print_report()
+
+    if args.reference:
+        reference = read_schedule_pair(data, Path(args.reference), VerificationReport())
+        print_diff(diff_schedules(data, schedule, reference))
+    return 0 if report.is_valid else 1
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='cli.py', description='Field service scheduling with IBM CPLEX')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    paths = argparse.ArgumentParser(add_help=False)
+    paths.add_argument('--results-dir', default='results',
+                       help='folder of the schedules (one sub-folder per instance)')
+    paths.add_argument('--output-dir', default='output_data',
+                       help='folder of the LP files and CPLEX node files')
+
+    command = commands.add_parser('solve', parents=[paths], help='solve an instance')
+    command.add_argument('instance', help='instance or random configuration file')
+    command.add_argument('--two-stage', action='store_true',
+                         help='placements first, then per-day worker assignments')
+    command.add_argument('--lns', action='store_true',
+                         help='improve the schedule with a large neighbourhood search')
+    command.add_argument('--lns-time-budget', type=float, default=60.0,
+                         help='seconds of large neighbourhood search')
+    command.add_argument('--low-memory', action='store_true',
+                         help='memory-bounded model and solve')
+    command.add_argument('--objective', default='profit',
+                         choices=['profit', 'weighted', 'lexicographic', 'pareto'],
+                         help='single or multi-objective mode')
+    command.add_argument('--stochastic', action='store_true',
+                         help='sample-average model over order cancellations')
+    command.add_argument('--output-format', default='json',
+                         choices=['json', 'jsonl', 'parquet'])
+    command.add_argument('--codec', default=None, choices=['gzip', 'zstd'],
+                         help='compression of jsonl or parquet schedules')
+    command.set_defaults(function=solve)
+
+    command = commands.add_parser('generate', help='draw a random instance')
+    command.add_argument('config', help='random configuration file ("is_random": true)')
+    command.add_argument('--output', '-o', required=True, help='instance file to write')
+    command.add_argument('--seed', type=int, default=42)
+    command.set_defaults(function=generate)
+
+    command = commands.add_parser('validate', help='check instance files')
+    command.add_argument('instances', nargs='+')
+    command.add_argument('--feasibility', action='store_true',
+                         help='also run the feasibility pre-checks')
+    command.set_defaults(function=validate)
+
+    command = commands.add_parser('benchmark', parents=[paths],
+                                  help='time and measure solves')
+    command.add_argument('instances', nargs='+')
+    command.add_argument('--two-stage', action='store_true')
+    command.add_argument('--low-memory', action='store_true')
+    command.add_argument('--time-limit', type=float, default=None)
+    command.add_argument('--output', '-o', default=None, help='JSON file for the results')
+    command.set_defaults(function=benchmark)
+
+    command = commands.add_parser('verify', help='check a schedule against its instance')
+    command.add_argument('instance')
+    command.add_argument('results', help='folder with orders_schedule.json and worker_schedule.json')
+    command.add_argument('reference', nargs='?', default=None,
+                         help='folder of a schedule to compare with')
+    command.set_defaults(function=verify)
+    return parser
+
+
+def check_options(parser: argparse.ArgumentParser, args) -> None:
+    # Options that a mode would otherwise ignore
+    if args.command == 'benchmark' and args.two_stage and args.low_memory:
+        parser.error('--low-memory does not apply to --two-stage')
+    if args.command == 'solve' and (args.two_stage or args.lns):
+        # These modes write orders_schedule.json and worker_schedule.json of
+        # the profit objective
+        mode = '--two-stage' if args.two_stage else '--lns'
+        ignored = [option for option, used in [
+            ('--output-format', args.output_format != 'json'),
+            ('--codec', args.codec is not None),
+            ('--objective', args.objective != 'profit'),
+            ('--stochastic', args.stochastic),
+            ('--low-memory', args.low_memory),
+        ] if used]
+        if ignored:
+            parser.error(f'{", ".join(ignored)} cannot be used with {mode}')
+
+
+def main(argv: list = None) -> None:
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] not in COMMANDS and not argv[0].startswith('-'):
+        # solver.py /path/to/config_file.json [options], as before
+        argv = ['solve'] + argv
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    check_options(parser, args)
+    code = args.function(args)
+    if args.command == 'solve':
+        sys.stdout.write('Script finished!\n')
+        sys.stdout.flush()
+    sys.exit(code)
+
+
+if __name__ == '__main__':
+    main()
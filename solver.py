@@ -1,67 +1,102 @@
 import cplex
 import datetime
-import os
+import numpy as np
 import srsly
-import sys
 
 from collections import defaultdict
 from pathlib import Path
 
+from utils.feasibility import check_feasibility, print_conflict, refine_conflict
 from utils.field_service_class import FieldServiceManagementInstance
+from utils.lns import improve_schedule, load_schedule
+from utils.memory import MemoryReport, configure_low_memory
+from utils.objectives import (add_fairness_variables, objective_terms, objective_values,
+                              pareto_sweep, print_pareto_front, set_multiobjective)
+from utils.schedule_writer import ScheduleWriter
+from utils.stochastic import (MODEL_SCENARIOS, evaluate_schedules, load_sample_average,
+                              print_evaluation, sample_cancellations, solution_assignments)
+from utils.two_stage import solve_two_stage
+from utils.variable_index import VariableIndex
+from utils.sequential_chains import OrderPlacements
 
 
 TOLERANCE = 10e-6
+# Worker variables are added to CPLEX in chunks of this size
+VARIABLE_CHUNK = 100000
 
 
-def get_instance_data():
+def get_instance_data(file_path: Path, data_path: Path = None):
+    # Loads an instance, or draws one from a random configuration file. Drawn
+    # instances are saved as loaded_<file name> in data_path, if given.
+    file_path = Path(file_path).resolve()
 
-    file_path = sys.argv[1].strip()
-    file_name = file_path.split('/')[-1]
-    file_location = Path(file_path)
+    instance = FieldServiceManagementInstance(file=file_path,
+                                              data_path=file_path.parent)
 
-    data_path = Path(os.path.dirname(__file__))
+    if instance.is_random and data_path:
+        data_path = Path(data_path)
+        data_path.mkdir(parents=True, exist_ok=True)
+        instance.data_path = data_path
+        instance.save_to_json(name=f'loaded_{file_path.name}')
+    return instance
 
-    instance = FieldServiceManagementInstance(file=file_location,
-                                              data_path=data_path)
 
-    if instance.is_random:
-        instance.save_to_json(name=f'loaded_{file_name}')
-    return instance
+def is_active(value: float) -> bool:
+    # Binary values come back from CPLEX within its integrality tolerance
+    # (e.g. 1e-9 instead of 0), so they are compared against 1 with TOLERANCE
+    return value >= 1.0 - TOLERANCE
 
 
-def create_variables(my_problem, data) -> dict:
+def create_variables(my_problem, data, impossible_orders=(), names: bool = True) -> dict:
     variables = dict()
-    orders_vars = {}
-    worker_vars = {}
     alphas_var = {}
     payments_vars = {}
-    payments_x_vars = {}
-    payments_w_vars = {}
-
-    # First we initialize the orders variables
-    for _, order_row in data.orders_data.iterrows():
-        for day in range(data.number_of_days):
-            for shift in range(data.number_of_shifts):
-                orders_vars[order_row.order, day, shift] = my_problem.variables.add(
-                    obj=[float(order_row.profit)],
-                    lb=[0],
-                    ub=[1],
-                    types=[my_problem.variables.type.binary],
-                    names=[f'O_{order_row.order}_{day}_{shift}']
-                )
+    payments_count_vars = {}
 
-    # loading worker variables
-    for worker in range(data.number_of_workers):
-        for order in range(data.number_of_orders):
-            for day in range(data.number_of_days):
-                for shift in range(data.number_of_shifts):
-                    worker_vars[worker, order, day, shift] = my_problem.variables.add(
-                        obj=[0.0],
-                        lb=[0],
-                        ub=[1],
-                        types=[my_problem.variables.type.binary],
-                        names=[f'T^{worker}_{order}_{day}_{shift}']
-                    )
+    # First we initialize the orders variables. Placements linked by
+    # sequential pairs share a single variable, and placements that can never
+    # be selected get no variable at all.
+    # 1/t[i1] \sum_{n} worker_vars[n][i1][j][k] == 1/t[i2] \sum_{n} worker_vars[n][i2][j][k+1]
+    #   \forall j,k, (i1,i2) in correlative orders
+    # is then satisfied by construction.
+    placements = OrderPlacements(data, impossible_orders)
+    profits = data.profits.tolist()
+    orders_indices = np.full(
+        (data.number_of_orders, data.number_of_days, data.number_of_shifts),
+        -1, dtype=np.int64)
+    for _, keys in placements.alive_groups():
+        order, day, shift = keys[0]
+        group_var = my_problem.variables.add(
+            obj=[float(sum(profits[key[0]] for key in keys))],
+            lb=[0],
+            ub=[1],
+            types=[my_problem.variables.type.binary],
+            names=[f'O_{order}_{day}_{shift}'] if names else None
+        )
+        for key in keys:
+            orders_indices[key] = group_var[0]
+    orders_vars = VariableIndex(orders_indices)
+
+    # loading worker variables, only for the eligible (worker, order, day, shift)
+    # tuples of the placements that can be selected. Their indices are
+    # consecutive, so they are kept in a numpy array and added in chunks.
+    eligible = data.eligibility_mask() & placements.alive_mask()[..., None]
+    worker_vars = VariableIndex.from_mask(
+        np.ascontiguousarray(eligible.transpose(3, 0, 1, 2)),
+        my_problem.variables.get_num())
+    number_of_worker_vars = len(worker_vars)
+    for start in range(0, number_of_worker_vars, VARIABLE_CHUNK):
+        size = min(VARIABLE_CHUNK, number_of_worker_vars - start)
+        my_problem.variables.add(
+            obj=[0.0] * size,
+            lb=[0] * size,
+            ub=[1] * size,
+            types=[my_problem.variables.type.binary] * size
+        )
+    if names:
+        my_problem.variables.set_names(
+            (index[0], f'T^{worker}_{order}_{day}_{shift}')
+            for (worker, order, day, shift), index in worker_vars.items())
 
     # loading auxiliar variables to determine if the worker has worked at least
     # one shift in a given day \alpha
@@ -72,7 +107,7 @@ def create_variables(my_problem, data) -> dict:
                 lb=[0],
                 ub=[1],
                 types=[my_problem.variables.type.binary],
-                names=[f'alpha^{worker}_{day}']
+                names=[f'alpha^{worker}_{day}'] if names else None
             )
 
     # loading Payment variable
@@ -82,81 +117,90 @@ def create_variables(my_problem, data) -> dict:
             lb=[0],
             ub=[10000000],
             types=[my_problem.variables.type.integer],
-            names=[f'P^{worker}']
+            names=[f'P^{worker}'] if names else None
         )
 
-    # Loading auxilary payments variables to account the number of
-    # orders in given step
-
-    number_of_partitions = 4
-    amount_of_orders_per_partition = [5, 4, 4, 100]
+    # Loading the number of orders performed by every worker, the argument of
+    # the piecewise linear payment
     for worker in range(data.number_of_workers):
-        for cost_step in range(number_of_partitions):
-            payments_x_vars[worker, cost_step] = my_problem.variables.add(
-                obj=[0.0],
-                lb=[0],
-                ub=[amount_of_orders_per_partition[cost_step]],
-                types=[my_problem.variables.type.integer],
-                names=[f'x^{worker}_{cost_step}']
-            )
-            if cost_step+1 < number_of_partitions:
-                payments_w_vars[worker, cost_step] = my_problem.variables.add(
-                    obj=[0.0],
-                    lb=[0],
-                    ub=[1],
-                    types=[my_problem.variables.type.binary],
-                    names=[f'w^{worker}_{cost_step}']
-                )
+        payments_count_vars[worker] = my_problem.variables.add(
+            obj=[0.0],
+            lb=[0],
+            ub=[data.number_of_orders],
+            types=[my_problem.variables.type.integer],
+            names=[f'N^{worker}'] if names else None
+        )
 
     # Finally we save the variables indices in a dictionary
     variables['orders'] = orders_vars
     variables['worker'] = worker_vars
     variables['alphas'] = alphas_var
     variables['payments'] = payments_vars
-    variables['payments_x'] = payments_x_vars
-    variables['payments_w'] = payments_w_vars
+    variables['payments_count'] = payments_count_vars
+    variables['placements'] = placements
 
     return variables
 
 
-def load_constraints(my_problem, data, variables) -> None:
+def load_constraints(my_problem, data, variables, names: bool = True) -> None:
 
     orders_vars = variables['orders']
     worker_vars = variables['worker']
     alphas_var = variables['alphas']
     payments_vars = variables['payments']
-    payments_x_vars = variables['payments_x']
-    payments_w_vars = variables['payments_w']
+    payments_count_vars = variables['payments_count']
+
+    # Worker variables grouped by placement, by worker and shift, by worker
+    # and day and by worker, from one pass over the eligible workers (CSR) of
+    # the placements that can be selected instead of every (n, i, j, k)
+    by_placement = {}
+    by_worker_shift = defaultdict(list)
+    by_worker_day = defaultdict(list)
+    by_worker = defaultdict(list)
+    for i, j, k in orders_vars.keys():
+        workers = data.eligible_workers(i, j, k)
+        indices = worker_vars.indices[workers, i, j, k].tolist()
+        by_placement[i, j, k] = indices
+        for n, index in zip(workers.tolist(), indices):
+            by_worker_shift[n, j, k].append(index)
+            by_worker_day[n, j].append(index)
+            by_worker[n].append(index)
 
     ## Beginning Constraints definiton ##
     # Constraint: each order i has to be done in only one shift in the week
     # sum(k in shifts, j in days) orders[i][j][k] == 1
     c_iter = 0
-    for i in range(len(data.orders_data)):
+    for i in range(data.number_of_orders):
         c_iter += 1
         ind = [list(orders_vars[i, j, k])[0]
                for j in range(data.number_of_days)
-               for k in range(data.number_of_shifts)]
+               for k in range(data.number_of_shifts)
+               if (i, j, k) in orders_vars]
+        if not ind:
+            continue
         val = [1.0] * len(ind)
         my_problem.linear_constraints.add(
             lin_expr=[cplex.SparsePair(ind=ind, val=val)],
             senses=["L"],
             rhs=[1.0],
-            names=[f'c_order#{c_iter}'])
+            names=[f'c_order#{c_iter}'] if names else None)
 
     # constraint: for a given order in a given day and shift. If the order is
     # setted up to be done,
     # it has to have the amount of workers needed attached
     # \sum_{n} worker_vars[n][i][j][k] == t[i] \cdot orders[i][j][k] \; \forall i,j,k
 
-    workers_per_order = data.orders_data.workers_needed.values.astype(int)
+    workers_per_order = data.workers_needed.tolist()
     c_iter = 0
-    for i in range(len(data.orders_data)):
+    for i in range(data.number_of_orders):
         for j in range(data.number_of_days):
             for k in range(data.number_of_shifts):
                 c_iter += 1
-                workers_involved = [list(worker_vars[n, i, j, k])[0]
-                                    for n in range(data.number_of_workers)]
+                if (i, j, k) not in orders_vars:
+                    # placement that can never be selected (no worker
+                    # variables were created for it)
+                    continue
+                workers_involved = by_placement[i, j, k]
                 ind = workers_involved + list(orders_vars[i, j, k])
                 val = [1] * len(workers_involved) + \
                     [-int(workers_per_order[i])]
@@ -164,7 +208,7 @@ def load_constraints(my_problem, data, variables) -> None:
                     lin_expr=[cplex.SparsePair(ind=ind, val=val)],
                     senses=["E"],
                     rhs=[0.0],
-                    names=[f'c_workers_needed#{c_iter}'])
+                    names=[f'c_workers_needed#{c_iter}'] if names else None)
 
     # constraint: any given worker cannot work more than one order at any time
     # \sum_i workers[n][i][j][k] \leq 1 \;\forall n,j,k
@@ -173,14 +217,15 @@ def load_constraints(my_problem, data, variables) -> None:
         for j in range(data.number_of_days):
             for k in range(data.number_of_shifts):
                 c_iter += 1
-                ind = [list(worker_vars[n, i, j, k])[0]
-                       for i in range(data.number_of_orders)]
+                ind = by_worker_shift.get((n, j, k))
+                if not ind:
+                    continue
                 val = [1.0] * len(ind)
                 my_problem.linear_constraints.add(
                     lin_expr=[cplex.SparsePair(ind=ind, val=val)],
                     senses=["L"],
                     rhs=[1.0],
-                    names=[f'c_worker_load#{c_iter}'])
+                    names=[f'c_worker_load#{c_iter}'] if names else None)
 
     # constraint: at any given day no worker can work more than 5 shifts
     # \sum_i \sum_k workers[n][i][j][k] \leq 4 \forall n,j
@@ -188,47 +233,35 @@ def load_constraints(my_problem, data, variables) -> None:
     for n in range(data.number_of_workers):
         for j in range(data.number_of_days):
             c_iter += 1
-            ind = [
-                list(worker_vars[n, i, j, k])[0]
-                for i in range(data.number_of_orders)
-                for k in range(data.number_of_shifts)
-            ]
+            ind = by_worker_day.get((n, j))
+            if not ind:
+                continue
             val = [1.0] * len(ind)
             my_problem.linear_constraints.add(
                 lin_expr=[cplex.SparsePair(ind=ind, val=val)],
                 senses=["L"],
                 rhs=[4.0],
-                names=[f'c_worker_shift#{c_iter}']
+                names=[f'c_worker_shift#{c_iter}'] if names else None
             )
 
     # constraint: for any given pair of workers the difference of assigned
     # tasks has to be lower than 10 at any given moment
     # \sum_{ijk} workers[n][i][j][k] - workers[m][i][j][k] \leq 10 \; \forall n,m
-
+    # Since N[n] = \sum_{ijk} workers[n][i][j][k] (c_payment_consistency), it
+    # is written as N[n] - N[m] \leq 10: two coefficients per row instead of
+    # every assignment variable of both workers.
     c_iter = 0
     for n in range(data.number_of_workers):
         for m in range(data.number_of_workers):
             c_iter += 1
             if n != m:
-                n_workers = [
-                    list(worker_vars[n, i, j, k])[0]
-                    for i in range(data.number_of_orders)
-                    for j in range(data.number_of_days)
-                    for k in range(data.number_of_shifts)
-                ]
-                m_workers = [
-                    list(worker_vars[m, i, j, k])[0]
-                    for i in range(data.number_of_orders)
-                    for j in range(data.number_of_days)
-                    for k in range(data.number_of_shifts)
-                ]
-                ind = n_workers + m_workers
-                val = [1.0] * len(n_workers) + [-1.0] * len(m_workers)
+                ind = list(payments_count_vars[n]) + list(payments_count_vars[m])
+                val = [1.0, -1.0]
                 my_problem.linear_constraints.add(
                     lin_expr=[cplex.SparsePair(ind=ind, val=val)],
                     senses=["L"],
                     rhs=[10.0],
-                    names=[f'c_workers_difference#{c_iter}']
+                    names=[f'c_workers_difference#{c_iter}'] if names else None
                 )
 
     # constaraint: No worker can work all the days of the planification
@@ -246,7 +279,7 @@ def load_constraints(my_problem, data, variables) -> None:
             lin_expr=[cplex.SparsePair(ind=ind, val=val)],
             senses=["L"],
             rhs=[5.0],
-            names=[f'c_alphas#{c_iter}']
+            names=[f'c_alphas#{c_iter}'] if names else None
         )
 
     # c2
@@ -257,18 +290,14 @@ def load_constraints(my_problem, data, variables) -> None:
     for n in range(data.number_of_workers):
         for j in range(data.number_of_days):
             c_iter += 1
-            workers_involved = [
-                list(worker_vars[n, i, j, k])[0]
-                for i in range(data.number_of_orders)
-                for k in range(data.number_of_shifts)
-            ]
+            workers_involved = by_worker_day.get((n, j), [])
             ind = workers_involved + [list(alphas_var[n, j])[0]]
             val = [1.0] * len(workers_involved) + [-M_cte_value]
             my_problem.linear_constraints.add(
                 lin_expr=[cplex.SparsePair(ind=ind, val=val)],
                 senses=["L"],
                 rhs=[0.0],
-                names=[f'c_alpha_worker#{c_iter}']
+                names=[f'c_alpha_worker#{c_iter}'] if names else None
             )
 
     # c3
@@ -277,212 +306,36 @@ def load_constraints(my_problem, data, variables) -> None:
     for n in range(data.number_of_workers):
         for j in range(data.number_of_days):
             c_iter += 1
-            workers_involved = [
-                list(worker_vars[n, i, j, k])[0]
-                for i in range(data.number_of_orders)
-                for k in range(data.number_of_shifts)
-            ]
+            workers_involved = by_worker_day.get((n, j), [])
             ind = workers_involved + [list(alphas_var[n, j])[0]]
             val = [1.0] * len(workers_involved) + [-1.0]
             my_problem.linear_constraints.add(
                 lin_expr=[cplex.SparsePair(ind=ind, val=val)],
                 senses=["G"],
                 rhs=[0.0],
-                names=[f'c_alpha_consistency#{c_iter}']
+                names=[f'c_alpha_consistency#{c_iter}'] if names else None
             )
 
-    # constraint: payment conditions
-    # \sum_m unit_payment[m] \cdot \payments_x_vars[n][m] = P[n] \; \forall n
-    number_of_payments_pieces = 4
-    payments_partitions = [1000, 1200, 1400, 1500]
-    c_iter = 0
-    for n in range(data.number_of_workers):
-        c_iter += 1
-        orders_by_worker = [
-            list(payments_x_vars[n, m])[0]
-            for m in range(number_of_payments_pieces)
-        ]
-
-        ind = orders_by_worker + list(payments_vars[n])
-        val = payments_partitions + [-1.0]
-        my_problem.linear_constraints.add(
-            lin_expr=[cplex.SparsePair(
-                ind=ind,
-                val=val)
-            ],
-            senses=["E"],
-            rhs=[0.0],
-            names=[f'c_payment_summ#{c_iter}']
-        )
-
-    # constraint: payment conditions. There is a piecewise payment schema associated to the number of
-    # tasks achieved for any given worker
-    # \sum_m payments_x_vars[n][m] = \sum_i\sum_j\sum_k worker[n][i][j][k] \; \forall n
+    # constraint: the number of orders of every worker
+    # N[n] = \sum_i\sum_j\sum_k worker[n][i][j][k] \; \forall n
     c_iter = 0
     for n in range(data.number_of_workers):
         c_iter += 1
-        workers_involved = [
-            list(worker_vars[n, i, j, k])[0]
-            for i in range(data.number_of_orders)
-            for j in range(data.number_of_days)
-            for k in range(data.number_of_shifts)
-        ]
-        pieces_involved = [
-            list(payments_x_vars[n, m])[0]
-            for m in range(number_of_payments_pieces)
-        ]
-        ind = workers_involved + pieces_involved
-        val = [1.0] * len(workers_involved) + [-1.0] * len(pieces_involved)
+        workers_involved = by_worker.get(n, [])
+        ind = workers_involved + list(payments_count_vars[n])
+        val = [1.0] * len(workers_involved) + [-1.0]
         my_problem.linear_constraints.add(
             lin_expr=[cplex.SparsePair(ind=ind, val=val)],
             senses=["E"],
             rhs=[0.0],
-            names=[f'c_payment_consistency#{c_iter}']
+            names=[f'c_payment_consistency#{c_iter}'] if names else None
         )
 
-    # constraint: forcing w auxiliary values to "turn on" when the
-    # conditions are met
-    # payments_w_vars[n,3] <= payments_w_vars[n,2]
-    # payments_w_vars[n,2] <= payments_w_vars[n,1]
-    c_iter = 0
-    for n in range(data.number_of_workers):
-        c_iter += 1
-        my_problem.linear_constraints.add(
-            lin_expr=[cplex.SparsePair(
-                ind=[list(payments_w_vars[n, 2])[0],
-                     list(payments_w_vars[n, 1])[0]],
-                val=[1.0, -1.0]
-            )
-            ],
-            senses=["L"],
-            rhs=[0.0],
-            names=[f'c_w1_activation#{c_iter}']
-        )
-        my_problem.linear_constraints.add(
-            lin_expr=[cplex.SparsePair(
-                ind=[list(payments_w_vars[n, 1])[0],
-                     list(payments_w_vars[n, 0])[0]],
-                val=[1.0, -1.0]
-            )
-            ],
-            senses=["L"],
-            rhs=[0.0],
-            names=[f'c_w2_activation#{c_iter}']
-        )
-
-    # constraint: forcing x auxiliary variables to count up to a certain ceil value
-    # this will allow the piecewise distribution of the payments
-    # payments_x_vars[n,m] where m = {0,1,2,3}
-    # payments_w_vars[n,m] where m = {0,1,2,3} w[n][3] == 0
-
-    pieces = [
-        [5.0, 5.0],
-        [4.0, 4.0],
-        [4.0, 4.0],
-        [0, 15.0]
-    ]
-    c_iter = 0
-    for n in range(data.number_of_workers):
-        # first condition 5 * payments_w_vars[n,0] <= payments_x_vars[n,0] <= 5
-        # 5 * payments_w_vars[n,0] <= payments_x_vars[n,0]
-        c_iter += 1
-        my_problem.linear_constraints.add(
-            lin_expr=[cplex.SparsePair(
-                ind=[list(payments_w_vars[n, 0])[0],
-                     list(payments_x_vars[n, 0])[0]],
-                val=[pieces[0][0], -1.0]
-            )
-            ],
-            senses=["L"],
-            rhs=[0.0],
-            names=[f'c_w1x1_1_activation#{c_iter}']
-        )
-        # payments_x_vars[n,0] <= 5
-        my_problem.linear_constraints.add(
-            lin_expr=[cplex.SparsePair(
-                ind=[list(payments_x_vars[n, 0])[0]],
-                val=[1.0]
-            )
-            ],
-            senses=["L"],
-            rhs=[pieces[0][1]],
-            names=[f'c_w1x1_2_activation#{c_iter}']
-        )
-
-        # second condition (10-6) * payments_w_vars[n,1] <= payments_x_vars[n,1] <= (10-6) * payments_w_vars[n,0]
-        # (10-6) * payments_w_vars[n,1] <= payments_x_vars[n,1]
-        my_problem.linear_constraints.add(
-            lin_expr=[cplex.SparsePair(
-                ind=[list(payments_w_vars[n, 1])[0],
-                     list(payments_x_vars[n, 1])[0]],
-                val=[pieces[1][0], -1.0]
-            )
-            ],
-            senses=["L"],
-            rhs=[0.0],
-            names=[f'c_w2x2_1_activation#{c_iter}']
-        )
-        # payments_x_vars[n,1] <= (10-6) * payments_w_vars[n,0]
-        my_problem.linear_constraints.add(
-            lin_expr=[cplex.SparsePair(
-                ind=[list(payments_x_vars[n, 1])[0],
-                     list(payments_w_vars[n, 0])[0]],
-                val=[1.0, -pieces[1][1]]
-            )
-            ],
-            senses=["L"],
-            rhs=[0.0],
-            names=[f'c_w2x2_2_activation#{c_iter}']
-        )
-        # third condition (15-11) * payments_w_vars[n,2] <= payments_x_vars[n,1] <= (15-11) * payments_w_vars[n,1]
-        # (15-11) * payments_w_vars[n,2] <= payments_x_vars[n,2]
-        my_problem.linear_constraints.add(
-            lin_expr=[cplex.SparsePair(
-                ind=[list(payments_w_vars[n, 2])[0],
-                     list(payments_x_vars[n, 2])[0]],
-                val=[pieces[2][0], -1.0]
-            )
-            ],
-            senses=["L"],
-            rhs=[0.0],
-            names=[f'c_w3x3_1_activation#{c_iter}']
-        )
-        # payments_x_vars[n,2] <= (15-11) * payments_w_vars[n,1]
-        my_problem.linear_constraints.add(
-            lin_expr=[cplex.SparsePair(
-                ind=[list(payments_x_vars[n, 2])[0],
-                     list(payments_w_vars[n, 1])[0]],
-                val=[1.0, -pieces[2][1]]
-            )
-            ],
-            senses=["L"],
-            rhs=[0.0],
-            names=[f'c_w3x3_2_activation#{c_iter}']
-        )
-        # last condition 0 <= payments_x_vars[n,3] <= 15 * payments_w_vars[n,2]
-        # 0 <= payments_x_vars[n,3]
-        my_problem.linear_constraints.add(
-            lin_expr=[cplex.SparsePair(
-                ind=[list(payments_x_vars[n, 3])[0]],
-                val=[1.0]
-            )
-            ],
-            senses=["G"],
-            rhs=[pieces[3][0]],
-            names=[f'c_w3x3_1_activation#{c_iter}']
-        )
-        # payments_x_vars[n,3] <= (15) * payments_w_vars[n,2]
-        my_problem.linear_constraints.add(
-            lin_expr=[cplex.SparsePair(
-                ind=[list(payments_x_vars[n, 3])[0],
-                     list(payments_w_vars[n, 2])[0]],
-                val=[1.0, -pieces[3][1]]
-            )
-            ],
-            senses=["L"],
-            rhs=[0.0],
-            names=[f'c_w3x3_2_activation#{c_iter}']
-        )
+    # constraint: payment conditions. There is a piecewise payment schema
+    # associated to the number of tasks achieved for any given worker, taken
+    # from the tier table of the instance: P[n] = cost(N[n]) \; \forall n
+    load_payment_constraints(my_problem, data, payments_vars, payments_count_vars,
+                             names=names)
 
     # constraint: for a given pair (i1,i2) of orders it has to be that if i1 is done for a given combination j,k
     # is NOT possible to perform i2 after i1 (shift k+1). This rule applies over all workers.
@@ -491,139 +344,141 @@ def load_constraints(my_problem, data, variables) -> None:
     # workers[n][i1][j][k] \leq 1 - workers[n][i2][j][k+1]\; \forall n,j,k,(i_{1},i_{2})
     # where i1,i2 are in a list of non consecutive orders
 
-    nonseq_pairs = data.non_consecutive_orders.values.astype(int)
-    c_iter = 0
-    for n in range(data.number_of_workers):
-        for j in range(data.number_of_days):
-            for k in range(data.number_of_shifts-1):
-                for pair in nonseq_pairs:
-                    c_iter += 1
-                    ind = [
-                        list(worker_vars[n, pair[0], j, k])[0],
-                        list(worker_vars[n, pair[1], j, k+1])[0]
-                    ]
-                    val = [1.0, 1.0]
-                    my_problem.linear_constraints.add(
-                        lin_expr=[cplex.SparsePair(ind=ind, val=val)],
-                        senses=["L"],
-                        rhs=[1.0],
-                        names=[f'c_nonseq_pairs#{c_iter}']
-                    )
-
-    # constraint: for a given pair (i1,i2) of orders if i1 is done in the day j shift k, the order
-    # i2 has to be done in the next shift. This condition does not fix the worker n, but ANY worker has
-    # to fulfill the given orders.
-    # In this case, the condition to met will be:
-    #
-    # 1/t[i1] \sum_{n} worker_vars[n][i1][j][k] == 1/t[i2] \sum_{n} worker_vars[n][i2][j][k+1]
-    #   \forall j,k, (i1,i2) in correlative orders
-
-    seq_pairs = data.sequential_orders_data.values.astype(int)
-    c_iter = 0
-    for j in range(data.number_of_days):
-        for k in range(data.number_of_shifts):
-            for pair in seq_pairs:
-                c_iter += 1
-                workers_order_a = [
-                    list(worker_vars[n, pair[0], j, k])[0]
-                    for n in range(data.number_of_workers)
-                ]
-                c_iter += 1
-                if k < data.number_of_shifts-1:
-                    workers_order_b = [
-                        list(worker_vars[n, pair[1], j, k+1])[0]
-                        for n in range(data.number_of_workers)
-                    ]
-                    ind = workers_order_a + workers_order_b
-                    val = [1.0/workers_per_order[pair[0]]] * \
-                        len(workers_order_a) + \
-                        [-1.0/workers_per_order[pair[1]]] * \
-                        len(workers_order_b)
-                    my_problem.linear_constraints.add(
-                        lin_expr=[cplex.SparsePair(ind=ind, val=val)],
-                        senses=["E"],
-                        rhs=[0.0],
-                        names=[f'c_seq_pairs#{c_iter}']
-                    )
-                else:
-                    ind = workers_order_a
-                    val = [1.0/workers_per_order[pair[0]]] * \
-                        len(workers_order_a)
-                    my_problem.linear_constraints.add(
-                        lin_expr=[cplex.SparsePair(ind=ind, val=val)],
-                        senses=["E"],
-                        rhs=[0.0],
-                        names=[f'c_seq_pairs#{c_iter}']
-                    )
+    add_pair_rows(my_problem, next_shift_pair_rows(data, variables,
+                                                   data.non_consecutive_partners),
+                  'c_nonseq_pairs', names)
 
     # constraint: conflictive workers should not be assigned in the same order
     #
     # workers[n1][i][j][k] \leq 1 - workers[n2][i][j][k]\; \forall i,j,k,(n1,n2)
     # where n1,n2 are in a list of conflictive workers
 
-    cw_pairs = data.conflicting_workers.values.astype(int)
-    c_iter = 0
-    for i in range(data.number_of_orders):
-        for j in range(data.number_of_days):
-            for k in range(data.number_of_shifts):
-                for pair in cw_pairs:
-                    c_iter += 1
-                    ind = [
-                        list(worker_vars[pair[0], i, j, k])[0],
-                        list(worker_vars[pair[1], i, j, k])[0]
-                    ]
-                    val = [1.0, 1.0]
-                    my_problem.linear_constraints.add(
-                        lin_expr=[cplex.SparsePair(ind=ind, val=val)],
-                        senses=["L"],
-                        rhs=[1.0],
-                        names=[f'c_cw_pairs#{c_iter}']
-                    )
+    add_pair_rows(my_problem, conflicting_worker_rows(data, variables),
+                  'c_cw_pairs', names)
 
     # constraint: repetitive orders should be avoided on the next turn for a given worker
     #
     # workers[n][i1][j][k] \leq 1 - workers[n][i2][j][k+1]\; \forall n,j,k,(i1,i2)
     # where n1,n2 are in a list of conflictive workers
 
-    ro_pairs = data.repetitive_orders.values.astype(int)
-    c_iter = 0
-    for n in range(data.number_of_workers):
-        for j in range(data.number_of_days):
-            for k in range(data.number_of_shifts-1):
-                for pair in ro_pairs:
-                    c_iter += 1
-                    ind = [
-                        list(worker_vars[n, pair[0], j, k])[0],
-                        list(worker_vars[n, pair[1], j, k+1])[0]
-                    ]
-                    val = [1.0, 1.0]
-                    my_problem.linear_constraints.add(
-                        lin_expr=[cplex.SparsePair(ind=ind, val=val)],
-                        senses=["L"],
-                        rhs=[1.0],
-                        names=[f'c_ro_pairs#{c_iter}']
-                    )
+    add_pair_rows(my_problem, next_shift_pair_rows(data, variables,
+                                                   data.repetitive_partners),
+                  'c_ro_pairs', names)
+
+
+def next_shift_pair_rows(data, variables, partners: list) -> list:
+    # (T[n][i1][j][k], T[n][i2][j][k+1]) index pairs for every order i2 in
+    # partners[i1], over the placements that can be selected and the workers
+    # eligible for both of them (only those need a row)
+    orders_vars = variables['orders']
+    worker_indices = variables['worker'].indices
+    rows = []
+    for i1, j, k in orders_vars.keys():
+        if k + 1 >= data.number_of_shifts or not len(partners[i1]):
+            continue
+        workers_1 = data.eligible_workers(i1, j, k)
+        for i2 in partners[i1].tolist():
+            if (i2, j, k + 1) not in orders_vars:
+                continue
+            workers = np.intersect1d(workers_1, data.eligible_workers(i2, j, k + 1))
+            rows += zip(worker_indices[workers, i1, j, k].tolist(),
+                        worker_indices[workers, i2, j, k + 1].tolist())
+    return rows
+
+
+def conflicting_worker_rows(data, variables) -> list:
+    # (T[n1][i][j][k], T[n2][i][j][k]) index pairs for the conflicting workers
+    # n1 < n2 that are both eligible for a placement that can be selected
+    worker_indices = variables['worker'].indices
+    partners = data.conflicting_partners
+    rows = []
+    for i, j, k in variables['orders'].keys():
+        workers = data.eligible_workers(i, j, k)
+        eligible = set(workers.tolist())
+        for n1 in workers.tolist():
+            for n2 in partners[n1].tolist():
+                if n2 > n1 and n2 in eligible:
+                    rows.append((int(worker_indices[n1, i, j, k]),
+                                 int(worker_indices[n2, i, j, k])))
+    return rows
+
+
+def add_pair_rows(my_problem, rows: list, name: str, names: bool = True) -> None:
+    # x_a + x_b \leq 1 for every (a, b) index pair
+    if not rows:
+        return
+    my_problem.linear_constraints.add(
+        lin_expr=[cplex.SparsePair(ind=list(row), val=[1.0, 1.0]) for row in rows],
+        senses=["L"] * len(rows),
+        rhs=[1.0] * len(rows),
+        names=[f'{name}#{c_iter}' for c_iter in range(1, len(rows) + 1)] if names else None
+    )
+
+
+def load_payment_constraints(my_problem, data, payments_vars, payments_count_vars,
+                             names: bool = True, suffix: str = '') -> None:
+    # P[n] = cost(N[n]) for every worker n of payments_vars, with the tier
+    # table of the instance. suffix tells apart the names of several sets of
+    # payment variables (e.g. one per cancellation scenario).
+    breakpoints, costs = data.payment_breakpoints()
+    rates = data.payment_tier_rates.tolist()
+    if all(low <= high for low, high in zip(rates, rates[1:])):
+        # Non decreasing rates: the cost is convex and, since P is minimized,
+        # it is enough to keep P above every segment (the convex hull):
+        # P[n] \geq cost(b_m) + rate_m (N[n] - b_m) \; \forall n,m
+        c_iter = 0
+        for n in payments_vars:
+            for breakpoint, cost, rate in zip(breakpoints, costs, rates):
+                c_iter += 1
+                my_problem.linear_constraints.add(
+                    lin_expr=[cplex.SparsePair(
+                        ind=list(payments_vars[n]) + list(payments_count_vars[n]),
+                        val=[1.0, -rate])
+                    ],
+                    senses=["G"],
+                    rhs=[cost - rate * breakpoint],
+                    names=[f'c_payment_tier{suffix}#{c_iter}'] if names else None
+                )
+    else:
+        # Any other schema is handed to CPLEX as a piecewise linear constraint
+        for n in payments_vars:
+            my_problem.pwl_constraints.add(
+                vary=list(payments_vars[n])[0],
+                varx=list(payments_count_vars[n])[0],
+                preslope=rates[0],
+                postslope=rates[-1],
+                breakx=breakpoints,
+                breaky=costs,
+                name=f'c_payment_pwl{suffix}#{n + 1}'
+            )
 
 
-def populate_by_row(my_problem, data) -> dict:
+def populate_by_row(my_problem, data, impossible_orders=(), write_lp: bool = True,
+                    verbose: bool = True, names: bool = True,
+                    output_path: Path = Path('output_data')) -> dict:
 
-    vars = create_variables(my_problem, data)
+    vars = create_variables(my_problem, data, impossible_orders, names=names)
+    if verbose:
+        vars['placements'].print_summary()
 
     # Seteamos problema de minimizacion.
     my_problem.objective.set_sense(my_problem.objective.sense.maximize)
 
     # Segundo: definir las restricciones del modelo. Encapsulamos esto en una funcion.
-    load_constraints(my_problem, data, vars)
+    load_constraints(my_problem, data, vars, names=names)
 
     # Exportamos el LP cargado en myprob con formato .lp.
     # Util para debug.
-    my_problem.write(
-        f'output_data/fsm_problem_{datetime.datetime.now().strftime("%m%d%Y_%H%M")}.lp')
+    if write_lp:
+        output_path.mkdir(parents=True, exist_ok=True)
+        my_problem.write(str(
+            output_path/f'fsm_problem_{datetime.datetime.now().strftime("%m%d%Y_%H%M")}.lp'))
 
     return vars
 
 
-def solve_lp(my_problem, data, var_indices):
+def solve_lp(my_problem, data, var_indices, results_path: Path, output_format: str = 'json',
+             codec: str = None, names: bool = True):
 
     # Tercero: resolvemos el LP.
     # Definimos los parametros del solver
@@ -646,58 +501,78 @@ def solve_lp(my_problem, data, var_indices):
 
     my_problem.solve()
 
+    status = my_problem.solution.get_status()
+    if status in (my_problem.solution.status.MIP_infeasible,
+                  my_problem.solution.status.MIP_infeasible_or_unbounded):
+        print('Status solucion: ',
+              my_problem.solution.get_status_string(status_code=status),
+              '(' + str(status) + ')')
+        if names:
+            print_conflict(refine_conflict(my_problem))
+        else:
+            print('Run without --low-memory to refine the conflict')
+        return
+    if my_problem.solution.get_solution_type() == my_problem.solution.type.none:
+        print('Status solucion: ',
+              my_problem.solution.get_status_string(status_code=status),
+              '(' + str(status) + ') - no solution available')
+        return
+
     # Cuarto: obtenemos informacion de la solucion. Esto lo hacemos a traves de 'solution'.
     # - los valores de las variables. Usamos las funcion get_values().
     # - el valor del funcional. Usamos get_objective_value()
     # - el status de la solucion. Usamos get_status()
     var_results = my_problem.solution.get_values()
     objective_value = my_problem.solution.get_objective_value()
-    status = my_problem.solution.get_status()
     status_string = my_problem.solution.get_status_string(status_code=status)
 
     print('Funcion objetivo: ', objective_value)
     print('Status solucion: ', status_string, '(' + str(status) + ')')
 
-    result_dict = {
-        k: v
-        for k, v in zip(my_problem.variables.get_names(), var_results)
-    }
+    if names:
+        # Without names (memory-bounded mode) the values are not dumped
+        result_dict = {
+            k: v
+            for k, v in zip(my_problem.variables.get_names(), var_results)
+        }
 
-    file_name = sys.argv[1].strip().split("/")[-1].split(".")[0]
-    output_path = Path(f'results/{file_name}')
-    output_path.mkdir(parents=True, exist_ok=True)
+        results_path.mkdir(parents=True, exist_ok=True)
 
-    srsly.write_json(
-        output_path/f'fsm_problem_{datetime.datetime.now().strftime("%m%d%Y_%H%M")}.json', result_dict)
+        srsly.write_json(
+            results_path/f'fsm_problem_{datetime.datetime.now().strftime("%m%d%Y_%H%M")}.json', result_dict)
+
+    parse_results(var_indices, my_problem, data, results_path,
+                  output_format=output_format, codec=codec)
 
-    parse_results(var_indices, my_problem, data)
 
+def parse_results(var_indices, my_problem, data, results_path: Path,
+                  output_format: str = 'json', codec: str = None):
 
-def parse_results(var_indices, my_problem, data):
+    results_path.mkdir(parents=True, exist_ok=True)
 
-    file_name = sys.argv[1].strip().split("/")[-1].split(".")[0]
-    data_path = Path(f'results/{file_name}')
-    data_path.mkdir(parents=True, exist_ok=True)
+    if output_format != 'json':
+        stream_results(var_indices, my_problem, data, results_path,
+                       output_format, codec)
+        return
 
     orders_vars = var_indices['orders']
     worker_vars = var_indices['worker']
     alphas_var = var_indices['alphas']
     payments_vars = var_indices['payments']
-    payments_x_vars = var_indices['payments_x']
-    payments_w_vars = var_indices['payments_w']
+    payments_count_vars = var_indices['payments_count']
 
     worker_schedule = defaultdict(dict)
     orders_schedule = defaultdict(dict)
 
-    off_values = [0.0, -0.0]
-
     for n in range(data.number_of_workers):
         for j in range(data.number_of_days):
             for k in range(data.number_of_shifts):
                 for i in range(data.number_of_orders):
+                    if (n, i, j, k) not in worker_vars:
+                        continue
                     result = my_problem.solution.get_values(
                         list(worker_vars[n, i, j, k]))
-                    if result[0] not in off_values:
+                    if is_active(result[0]):
                         worker_schedule[n+1].update(
                             {
                                 f'order_{i+1}':
@@ -711,18 +586,21 @@ def parse_results(var_indices, my_problem, data):
     for i in range(data.number_of_orders):
         for j in range(data.number_of_days):
             for k in range(data.number_of_shifts):
+                if (i, j, k) not in orders_vars:
+                    continue
                 result = my_problem.solution.get_values(
                     list(orders_vars[i, j, k]))
-                if result[0] not in off_values:
+                if is_active(result[0]):
                     orders_schedule[f'order_{i}'].update(
                         {
                             'day': j+1,
                             'shift': k+1,
-                            'workers_needed': int(data.orders_data.workers_needed.iloc[i]),
+                            'workers_needed': int(data.workers_needed[i]),
                             'workers_involved':
                                 [f'worker_{n}'
                                     for n in range(data.number_of_workers)
-                                    if bool(my_problem.solution.get_values(
+                                    if (n, i, j, k) in worker_vars
+                                    and is_active(my_problem.solution.get_values(
                                         list(worker_vars[n, i, j, k])[0]
                                     ))
                                  ]
@@ -731,36 +609,224 @@ def parse_results(var_indices, my_problem, data):
                     )
 
     srsly.write_json(
-        data_path/'worker_schedule.json', worker_schedule)
+        results_path/'worker_schedule.json', worker_schedule)
     srsly.write_json(
-        data_path/'orders_schedule.json', orders_schedule)
+        results_path/'orders_schedule.json', orders_schedule)
 
 
-def main():
+def stream_results(var_indices, my_problem, data, data_path, output_format, codec):
+    # Writes both schedules row by row (JSON Lines or Parquet, see
+    # utils/schedule_writer) while iterating the assignments, instead of
+    # building them in memory. Every row is independent, so no entry can
+    # overwrite another one.
+    orders_vars = var_indices['orders']
+    worker_vars = var_indices['worker']
+
+    values = my_problem.solution.get_values()
+
+    # worker_vars is filled worker by worker, so the rows of a worker are
+    # written contiguously
+    with ScheduleWriter(data_path, 'worker_schedule', output_format, codec) as writer:
+        for (n, i, j, k), index in worker_vars.items():
+            if is_active(values[index[0]]):
+                writer.write({'worker': n, 'order': i, 'day': j+1, 'shift': k+1})
+
+    with ScheduleWriter(data_path, 'orders_schedule', output_format, codec) as writer:
+        for i in range(data.number_of_orders):
+            for j in range(data.number_of_days):
+                for k in range(data.number_of_shifts):
+                    if (i, j, k) not in orders_vars \
+                            or not is_active(values[orders_vars[i, j, k][0]]):
+                        continue
+                    writer.write({
+                        'order': i,
+                        'day': j+1,
+                        'shift': k+1,
+                        'workers_needed': int(data.workers_needed[i]),
+                        'workers_involved': [
+                            n for n in data.eligible_workers(i, j, k).tolist()
+                            if is_active(values[worker_vars[n, i, j, k][0]])
+                        ]
+                    })
+
+
+def write_assignments(assignments, data, results_path: Path):
+    # Writes a schedule given as {(order, day, shift): [workers]} (e.g. from
+    # the two-stage solve) with the same layout as parse_results
+    results_path.mkdir(parents=True, exist_ok=True)
+
+    worker_schedule = defaultdict(dict)
+    orders_schedule = defaultdict(dict)
+    for (i, j, k), workers in sorted(assignments.items()):
+        for n in workers:
+            worker_schedule[n+1][f'order_{i+1}'] = {'shift': k+1, 'day': j+1}
+        orders_schedule[f'order_{i}'] = {
+            'day': j+1,
+            'shift': k+1,
+            'workers_needed': int(data.workers_needed[i]),
+            'workers_involved': [f'worker_{n}' for n in sorted(workers)]
+        }
+
+    srsly.write_json(
+        results_path/'worker_schedule.json', dict(sorted(worker_schedule.items())))
+    srsly.write_json(
+        results_path/'orders_schedule.json', orders_schedule)
+
+
+def main(args):
+    # Solves an instance, see the solve command of cli.py for the arguments
+    results_path = Path(args.results_dir)/Path(args.instance).stem
+    output_path = Path(args.output_dir)
+
+    # Memory-bounded mode: no names, node files on disk and a workmem cap
+    low_memory = args.low_memory
+    memory = MemoryReport()
 
     # Creating new instance data
-    data = get_instance_data()
+    with memory.phase('load instance'):
+        data = get_instance_data(args.instance, data_path=output_path)
 
     # Printing some insigths from the new data
     data.print_description()
 
+    # Cheap combinatorial checks before building the model
+    with memory.phase('feasibility checks'):
+        report = check_feasibility(data)
+    report.print_report()
+
+    if args.two_stage or args.lns:
+        if args.two_stage:
+            # Placements first, then per-day worker assignments in parallel
+            result = solve_two_stage(data, impossible_orders=report.impossible_orders)
+            print('Funcion objetivo: ', result['objective'])
+            print('Iteraciones: ', result['iterations'])
+            assignments = result['assignments']
+        else:
+            # Improving the schedule of a previous run
+            schedule_path = results_path/'orders_schedule.json'
+            if not schedule_path.exists():
+                others = sorted(path.name for path in results_path.glob('orders_schedule.*'))
+                print(f'--lns needs the {schedule_path} of a previous solve (or --two-stage)')
+                if others:
+                    print(f'Found {", ".join(others)}: solve again with --output-format json')
+                return 1
+            assignments = load_schedule(schedule_path)
+
+        if args.lns:
+            result = improve_schedule(data, assignments,
+                                      time_budget=args.lns_time_budget,
+                                      impossible_orders=report.impossible_orders)
+            print('Funcion objetivo: ', result['objective'])
+            assignments = result['assignments']
+
+        write_assignments(assignments, data, results_path)
+        return
+
+    if args.objective == 'pareto':
+        # Weighted variants of profit, fairness and working days in parallel
+        points = pareto_sweep(data, impossible_orders=report.impossible_orders)
+        print_pareto_front(points)
+        results_path.mkdir(parents=True, exist_ok=True)
+        srsly.write_json(results_path/'pareto_front.json', points)
+        return
+
     # Instanciating Cplex Problem class
     problem = cplex.Cplex()
     problem.set_problem_name(
         "field_service_management_problem")
+    if low_memory:
+        configure_low_memory(problem, workdir=output_path)
 
     # Loading Model
-    var_indices = populate_by_row(problem, data)
+    with memory.phase('build model'):
+        var_indices = populate_by_row(problem, data,
+                                      impossible_orders=report.impossible_orders,
+                                      write_lp=not low_memory, names=not low_memory,
+                                      output_path=output_path)
+
+    # Stochastic mode: sample-average model over cancellation scenarios
+    if args.stochastic:
+        cancelled = sample_cancellations(data, MODEL_SCENARIOS, np.random.default_rng(42))
+        load_sample_average(problem, data, var_indices, cancelled, names=not low_memory)
+
+    # Multi-objective modes: profit, workload fairness and working days
+    multiobjective = args.objective if args.objective != 'profit' else None
+    if multiobjective:
+        add_fairness_variables(problem, data, var_indices, names=not low_memory)
+        terms = objective_terms(problem, var_indices)
+        set_multiobjective(problem, terms, multiobjective)
 
     print(
         f'Number of variables loaded: {problem.variables.get_num()}')
 
-    # Solving the model
-    solve_lp(problem, data, var_indices)
+    # Solving the model (the schedules are streamed in memory-bounded mode)
+    output_format = args.output_format
+    if low_memory and output_format == 'json':
+        output_format = 'jsonl'
+    with memory.phase('solve and write results'):
+        solve_lp(problem, data, var_indices, results_path, output_format=output_format,
+                 codec=args.codec, names=not low_memory)
+
+    if multiobjective and \
+            problem.solution.get_solution_type() != problem.solution.type.none:
+        for name, value in objective_values(problem, terms).items():
+            print(f'Objetivo {name}: {value}')
+
+    if args.stochastic and \
+            problem.solution.get_solution_type() != problem.solution.type.none:
+        # Expected objective of the schedule over many more scenarios
+        print_evaluation(evaluate_schedules(
+            data, {'schedule': solution_assignments(problem, var_indices['worker'])}))
+
+    if low_memory:
+        memory.print_report()
+
+
+def benchmark_instance(file_path: Path, two_stage: bool = False, low_memory: bool = False,
+                       time_limit: float = None, output_path: Path = Path('output_data')) -> dict:
+    # Solves an instance without writing anything (but the CPLEX node files
+    # of the memory-bounded mode, in output_path) and returns the time and
+    # peak memory of every phase with the objective found
+    memory = MemoryReport()
+    with memory.phase('load instance'):
+        data = get_instance_data(file_path)
+    with memory.phase('feasibility checks'):
+        report = check_feasibility(data)
+
+    objective, status = None, None
+    if two_stage:
+        with memory.phase('two-stage solve'):
+            result = solve_two_stage(data, impossible_orders=report.impossible_orders,
+                                     time_limit=time_limit or 60.0)
+        objective, status = result['objective'], 'two-stage'
+    else:
+        problem = cplex.Cplex()
+        problem.set_log_stream(None)
+        problem.set_results_stream(None)
+        problem.set_warning_stream(None)
+        if low_memory:
+            configure_low_memory(problem, workdir=output_path)
+        if time_limit:
+            problem.parameters.timelimit.set(time_limit)
+        with memory.phase('build model'):
+            populate_by_row(problem, data, impossible_orders=report.impossible_orders,
+                            write_lp=False, verbose=False, names=not low_memory)
+        with memory.phase('solve'):
+            problem.solve()
+        status = problem.solution.get_status_string()
+        if problem.solution.get_solution_type() != problem.solution.type.none:
+            objective = problem.solution.get_objective_value()
+
+    return {
+        'instance': str(file_path),
+        'orders': data.number_of_orders,
+        'workers': data.number_of_workers,
+        'objective': objective,
+        'status': status,
+        'phases': memory.phases,
+    }
 
 
 if __name__ == '__main__':
-    main()
-    sys.stdout.write('Script finished!\n')
-    sys.stdout.flush()
-    sys.exit(0)
\ No newline at end of file
+    from cli import main as cli_main
+    cli_main()
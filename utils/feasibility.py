@@ -0,0 +1,215 @@
+import numpy as np
+import re
+
+from collections import defaultdict
+
+
+VARIABLE_NAME_PATTERNS = {
+    'orders': re.compile(r'^O_(?P<order>\d+)_(?P<day>\d+)_(?P<shift>\d+)$'),
+    'worker': re.compile(r'^T\^(?P<worker>\d+)_(?P<order>\d+)_(?P<day>\d+)_(?P<shift>\d+)$'),
+    'alphas': re.compile(r'^alpha\^(?P<worker>\d+)_(?P<day>\d+)$'),
+    'payments': re.compile(r'^P\^(?P<worker>\d+)$'),
+    'payments_count': re.compile(r'^N\^(?P<worker>\d+)$'),
+}
+
+
+class FeasibilityReport():
+    def __init__(self) -> None:
+        # order -> list of reasons why it can never be scheduled
+        self.impossible_orders = defaultdict(list)
+
+    def add(self, order: int, reason: str) -> None:
+        self.impossible_orders[int(order)].append(reason)
+
+    @property
+    def is_clean(self) -> bool:
+        return not self.impossible_orders
+
+    def print_report(self) -> None:
+        if self.is_clean:
+            print('Feasibility pre-check: no issues found')
+            return
+        print(f'Feasibility pre-check: {len(self.impossible_orders)} '
+              f'order(s) can never be scheduled')
+        for order in sorted(self.impossible_orders):
+            for reason in self.impossible_orders[order]:
+                print(f'    order_{order}: {reason}')
+
+
+def conflict_free_workers_bound(instance) -> int:
+    # Upper bound on the number of workers that can share an order: any
+    # matching of the conflict graph removes at least one worker per edge
+    # from every conflict-free team, so W - |matching| bounds the team size.
+    matched = set()
+    for worker_a, worker_b in instance.conflicting_worker_pairs.tolist():
+        if worker_a not in matched and worker_b not in matched:
+            matched.update((worker_a, worker_b))
+    return instance.number_of_workers - len(matched) // 2
+
+
+def sequential_chain_lengths(instance) -> list:
+    # Number of orders in the longest sequential chain starting at every
+    # order (itself included), None for orders on or leading to a cycle.
+    on_path, done = set(), {}
+    lengths = [None] * instance.number_of_orders
+
+    for root in range(instance.number_of_orders):
+        if root in done:
+            continue
+        stack = [(root, iter(instance.sequential_partners[root].tolist()))]
+        on_path.add(root)
+        while stack:
+            order, successors = stack[-1]
+            successor = next(successors, None)
+            if successor is None:
+                stack.pop()
+                on_path.discard(order)
+                chain = [lengths[s] for s in instance.sequential_partners[order].tolist()]
+                lengths[order] = None if None in chain else 1 + max(chain, default=0)
+                done[order] = True
+            elif successor in on_path:
+                # Cycle: every order on the current path is unreachable
+                done[successor] = True
+                lengths[successor] = None
+            elif successor not in done:
+                on_path.add(successor)
+                stack.append(
+                    (successor, iter(instance.sequential_partners[successor].tolist())))
+    return lengths
+
+
+def check_feasibility(instance) -> FeasibilityReport:
+    # Fast combinatorial checks over the instance arrays. It does not prove
+    # feasibility; it only detects orders that no schedule can perform.
+    report = FeasibilityReport()
+    workers_bound = conflict_free_workers_bound(instance)
+    workers_needed = instance.workers_needed
+
+    for order in range(instance.number_of_orders):
+        if workers_needed[order] > workers_bound:
+            report.add(order,
+                       f'needs {workers_needed[order]} workers but at most '
+                       f'{workers_bound} can work together once conflicts are applied')
+
+    eligible_workers = np.diff(instance.eligible_workers_indptr).reshape(
+        instance.number_of_orders, -1)
+    for order in np.flatnonzero(
+            (eligible_workers < workers_needed[:, None]).all(axis=1)).tolist():
+        report.add(order,
+                   f'no allowed (day, shift) has {workers_needed[order]} '
+                   f'eligible workers available')
+
+    lengths = sequential_chain_lengths(instance)
+    for order, length in enumerate(lengths):
+        if length is None:
+            report.add(order, 'belongs to (or leads to) a cycle of sequential orders')
+        elif length > instance.number_of_shifts:
+            report.add(order,
+                       f'starts a chain of {length} sequential orders but a day '
+                       f'only has {instance.number_of_shifts} shifts')
+
+    # Sequential successors are all performed on the same next shift, and
+    # every predecessor of an order is performed on the same previous shift.
+    # Those orders have different teams, each one conflict-free on its own,
+    # so together they can use every worker: the bound is W, not the size of
+    # a single conflict-free team. These checks must never flag an order that
+    # some schedule performs.
+    number_of_workers = instance.number_of_workers
+    predecessors = defaultdict(list)
+    for order_a, order_b in instance.sequential_pairs.tolist():
+        predecessors[order_b].append(order_a)
+    for order in range(instance.number_of_orders):
+        successors = instance.sequential_partners[order]
+        if len(successors) > 1 and workers_needed[successors].sum() > number_of_workers:
+            report.add(order,
+                       f'its sequential orders {successors.tolist()} need '
+                       f'{workers_needed[successors].sum()} workers on the same shift')
+        if len(predecessors[order]) > 1 \
+                and workers_needed[predecessors[order]].sum() > number_of_workers:
+            for predecessor in predecessors[order]:
+                report.add(predecessor,
+                           f'shares the shift before order_{order} with orders '
+                           f'{predecessors[order]} that need '
+                           f'{workers_needed[predecessors[order]].sum()} workers')
+
+    # A sequential pair that is also non-consecutive or repetitive must be
+    # done by two disjoint teams
+    sequential = set(map(tuple, instance.sequential_pairs.tolist()))
+    same_worker_forbidden = set(map(tuple, instance.non_consecutive_pairs.tolist())) \
+        | set(map(tuple, instance.repetitive_pairs.tolist()))
+    for order_a, order_b in sorted(sequential & same_worker_forbidden):
+        if workers_needed[order_a] + workers_needed[order_b] > instance.number_of_workers:
+            report.add(order_a,
+                       f'order_{order_b} follows it with a disjoint team, needing '
+                       f'{workers_needed[order_a] + workers_needed[order_b]} workers')
+
+    # If an order is impossible, so are the orders that force it
+    changed = True
+    while changed:
+        changed = False
+        for order_a, order_b in instance.sequential_pairs.tolist():
+            if order_b in report.impossible_orders \
+                    and order_a not in report.impossible_orders:
+                report.add(order_a, f'its sequential order_{order_b} can never be scheduled')
+                changed = True
+
+    return report
+
+
+def describe_variable(name: str) -> dict:
+    # Decodes a variable name created by create_variables into its family
+    # and ids
+    for family, pattern in VARIABLE_NAME_PATTERNS.items():
+        match = pattern.match(name)
+        if match:
+            return {'family': family, **{k: int(v) for k, v in match.groupdict().items()}}
+    return {'family': 'unknown'}
+
+
+def refine_conflict(my_problem) -> list:
+    # Runs the CPLEX conflict refiner on an infeasible model and maps every
+    # member of the conflict to its constraint family and order/worker ids.
+    my_problem.conflict.refine(my_problem.conflict.all_constraints())
+
+    constraint_type = my_problem.conflict.constraint_type
+    member_status = (my_problem.conflict.group_status.member,
+                     my_problem.conflict.group_status.possible_member)
+    variable_names = my_problem.variables.get_names()
+
+    conflict = []
+    for status, (_, group) in zip(my_problem.conflict.get(),
+                                  my_problem.conflict.get_groups()):
+        if status not in member_status:
+            continue
+        for kind, index in group:
+            if kind == constraint_type.linear:
+                name = my_problem.linear_constraints.get_names(index)
+                row = my_problem.linear_constraints.get_rows(index)
+                involved = [describe_variable(variable_names[i]) for i in row.ind]
+                family = name.split('#')[0]
+            elif kind in (constraint_type.lower_bound, constraint_type.upper_bound):
+                name = variable_names[index]
+                involved = [describe_variable(name)]
+                family = 'lower_bound' if kind == constraint_type.lower_bound \
+                    else 'upper_bound'
+            else:
+                name, involved, family = str(index), [], 'other'
+            conflict.append({
+                'family': family,
+                'name': name,
+                'orders': sorted({v['order'] for v in involved if 'order' in v}),
+                'workers': sorted({v['worker'] for v in involved if 'worker' in v}),
+            })
+    return conflict
+
+
+def print_conflict(conflict: list) -> None:
+    by_family = defaultdict(list)
+    for member in conflict:
+        by_family[member['family']].append(member)
+    print(f'Conflict refiner: {len(conflict)} constraint(s) in the conflict')
+    for family, members in by_family.items():
+        print(f'    {family}: {len(members)} constraint(s)')
+        for member in members:
+            print(f'        {member["name"]} '
+                  f'orders={member["orders"]} workers={member["workers"]}')
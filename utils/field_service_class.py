@@ -1,5 +1,4 @@
 import datetime
-import pandas as pd
 import numpy as np
 import os
 import srsly
@@ -7,13 +6,62 @@ import srsly
 from numpy import random
 from pathlib import Path
 
+from utils.instance_loader import CACHED_ARRAYS, load_cached_instance, \
+    read_problem_data, save_instance_cache
+
+
+# Weekly payment per order: [last order of the tier, payment per order]. The
+# last tier has no limit.
+DEFAULT_PAYMENT_TIERS = [[5, 1000], [9, 1200], [13, 1400], [None, 1500]]
+
+ORDERS_PAIR_COLUMNS = ['order_a', 'order_b']
+WORKERS_PAIR_COLUMNS = ['worker_a', 'worker_b']
+
+
+def _as_pairs(pairs) -> np.ndarray:
+    # Any list of pairs (possibly empty or None) as a (n, 2) int32 array
+    if pairs is None or len(pairs) == 0:
+        return np.empty((0, 2), dtype=np.int32)
+    return np.asarray(pairs, dtype=np.int32).reshape(-1, 2)
+
+
+def _distinct_pairs(pairs: np.ndarray) -> np.ndarray:
+    # Drops self pairs and repeated pairs, keeping the first appearance
+    pairs = pairs[pairs[:, 0] != pairs[:, 1]]
+    _, first = np.unique(pairs, axis=0, return_index=True)
+    return pairs[np.sort(first)]
+
+
+def _build_adjacency(pairs: np.ndarray, size: int, symmetric: bool = False) -> list:
+    # adjacency[a] holds every b such that (a, b) is a pair, sorted and
+    # without repetitions. If symmetric, (b, a) is also considered.
+    if symmetric:
+        pairs = np.concatenate([pairs, pairs[:, ::-1]])
+    pairs = np.unique(pairs, axis=0)
+    splits = np.searchsorted(pairs[:, 0], np.arange(1, size))
+    return np.split(pairs[:, 1], splits)
+
+
+def _skills_matrix(skills: list, skill_names: np.ndarray) -> np.ndarray:
+    # skills[x] is the list of skills of the worker/order x
+    matrix = np.zeros((len(skills), len(skill_names)), dtype=bool)
+    for element, element_skills in enumerate(skills):
+        matrix[element, np.searchsorted(skill_names, element_skills)] = True
+    return matrix
+
+
+def _pairs_dataframe(pairs: np.ndarray, columns: list):
+    import pandas as pd
+    return pd.DataFrame(data=pairs, columns=columns)
+
 
 class FieldServiceManagementInstance():
     def __init__(self, file: str = None, data_path: Path = None, seed: int = 42) -> None:
         # instance configuration
-        self.orders = []
-        self.price_per_order = []
-        self.workers = []
+        self.orders = np.empty(0, dtype=np.int32)
+        self.workers = np.empty(0, dtype=np.int32)
+        self.profits = np.empty(0, dtype=np.float64)
+        self.workers_needed = np.empty(0, dtype=np.int32)
         self.number_of_days = 6
         self.number_of_shifts = 5
         self.is_random = False
@@ -26,14 +74,29 @@ class FieldServiceManagementInstance():
         if file:
             self.read_problem_from_file(file)
 
-    def read_problem_from_file(self, file_name: str) -> None:
-        data = srsly.read_json(self.data_path/file_name)
-        if data:
+    def read_problem_from_file(self, file_name: str, use_cache: bool = True) -> None:
+        file_path = self.data_path/file_name
+        cached = load_cached_instance(file_path) if use_cache else None
+        if cached:
+            self.__load_problem_from_cache(**cached)
+        else:
+            data = read_problem_data(file_path)
             if data.get('is_random'):
                 self.is_random = True
                 self.__load_random_problem(**data)
             else:
                 self.__load_problem_from_file(**data)
+                if use_cache:
+                    save_instance_cache(file_path, self)
+        self._build_indexes()
+
+    def __load_problem_from_cache(self, **kwargs) -> None:
+        self.number_of_orders = kwargs.get('number_of_orders')
+        self.number_of_workers = kwargs.get('number_of_workers')
+        self.orders = np.arange(self.number_of_orders, dtype=np.int32)
+        self.workers = np.arange(self.number_of_workers, dtype=np.int32)
+        for name in CACHED_ARRAYS:
+            setattr(self, name, kwargs.get(name))
 
     def __load_random_problem(self, **kwargs) -> None:
         self.number_of_orders = kwargs.get('number_of_orders')
@@ -45,8 +108,8 @@ class FieldServiceManagementInstance():
         self.max_repetitive_orders = kwargs.get('max_repetitive_orders')
         self.p_conflic = kwargs.get('probability_of_conflict', 0.2)
 
-        self.orders = list(range(self.number_of_orders))
-        self.workers = list(range(self.number_of_workers))
+        self.orders = np.arange(self.number_of_orders, dtype=np.int32)
+        self.workers = np.arange(self.number_of_workers, dtype=np.int32)
 
         self.max_worker_per_order = self.max_worker_per_order \
             if self.max_worker_per_order != None \
@@ -74,104 +137,192 @@ class FieldServiceManagementInstance():
         self._init_repetitive_orders_dataframe(
             pairs_of_orders[-self.max_repetitive_orders:])
         self._init_conflicting_workers_dataframe()
+        self._load_eligibility()
+        self._load_payment_tiers()
+        self.cancellation_probabilities = np.zeros(self.number_of_orders)
 
     def _init_orders_dataframe(self) -> None:
-        self.price_per_order = random.randint(low=self.max_payment_per_order/2,
-                                              high=self.max_payment_per_order,
-                                              size=self.number_of_orders)
-        self.orders_data = pd.DataFrame(
-            data={
-                'order': self.orders,
-                'profit': self.price_per_order,
-                'workers_needed': random.randint(low=1,
-                                                 high=self.max_worker_per_order,
-                                                 size=self.number_of_orders)
-                if self.max_worker_per_order > 1
-                else 1
-            }
-        )
+        self.profits = random.randint(low=self.max_payment_per_order/2,
+                                      high=self.max_payment_per_order,
+                                      size=self.number_of_orders).astype(np.float64)
+        self.workers_needed = random.randint(low=1,
+                                             high=self.max_worker_per_order,
+                                             size=self.number_of_orders).astype(np.int32) \
+            if self.max_worker_per_order > 1 \
+            else np.ones(self.number_of_orders, dtype=np.int32)
 
     def _init_seq_orders_dataframe(self, indices: np.array) -> None:
-        self.sequential_orders_data = pd.DataFrame(
-            data={
-                'order_a': indices[:, 0],
-                'order_b': indices[:, 1]
-            }
-        )
+        self.sequential_pairs = _distinct_pairs(_as_pairs(indices))
 
     def _init_non_seq_orders_dataframe(self, indices: np.array) -> None:
-        self.non_consecutive_orders = pd.DataFrame(
-            data={
-                'order_a': indices[:, 0],
-                'order_b': indices[:, 1]
-            })
+        self.non_consecutive_pairs = _distinct_pairs(_as_pairs(indices))
 
     def _init_repetitive_orders_dataframe(self, indices: np.array) -> None:
-        self.repetitive_orders = pd.DataFrame(
-            data={
-                'order_a': indices[:, 0],
-                'order_b': indices[:, 1]
-            })
+        self.repetitive_pairs = _distinct_pairs(_as_pairs(indices))
 
     def _init_conflicting_workers_dataframe(self) -> None:
         total_conflicting_workers = int(self.number_of_workers*self.p_conflic)
         workers_no_team = random.choice(a=self.workers,
                                         size=(total_conflicting_workers, 2))
-        self.conflicting_workers = pd.DataFrame(
-            data={
-                'worker_a': workers_no_team[:, 0],
-                'worker_b': workers_no_team[:, 1]
-            }
-        )
+        self.conflicting_worker_pairs = _distinct_pairs(
+            _as_pairs(workers_no_team))
 
     def __load_problem_from_file(self, **kwargs) -> None:
         self.number_of_orders = kwargs.get('number_of_orders')
         self.number_of_workers = kwargs.get('number_of_workers')
-        self.orders = list(range(self.number_of_orders))
-        self.workers = list(range(self.number_of_workers))
+        self.orders = np.arange(self.number_of_orders, dtype=np.int32)
+        self.workers = np.arange(self.number_of_workers, dtype=np.int32)
 
-        self.orders_data = pd.DataFrame(
-            data={
-                'order': self.orders,
-                'profit': kwargs.get('payments'),
-                'workers_needed': kwargs.get('workers_per_order', 1)
-            }
-        )
+        self.profits = np.asarray(kwargs.get('payments'), dtype=np.float64)
+        self.workers_needed = np.broadcast_to(
+            np.asarray(kwargs.get('workers_per_order', 1), dtype=np.int32),
+            (self.number_of_orders,)).copy()
 
         sequential_orders = kwargs.get('sequential_orders')
-        self.sequential_orders_data = pd.DataFrame(
-            data=sequential_orders.get('pairs'),
-            columns=['order_a', 'order_b']
-        )
+        self.sequential_pairs = _as_pairs(sequential_orders.get('pairs'))
 
         non_seq_orders = kwargs.get('non_seq_orders')
-        self.non_consecutive_orders = pd.DataFrame(
-            data=non_seq_orders.get('pairs'),
-            columns=['order_a', 'order_b']
-        )
+        self.non_consecutive_pairs = _as_pairs(non_seq_orders.get('pairs'))
 
         ro_pairs = kwargs.get('repetitive_orders')
-        self.repetitive_orders = pd.DataFrame(
-            data=ro_pairs.get('pairs'),
-            columns=['order_a', 'order_b']
-        )
+        self.repetitive_pairs = _as_pairs(ro_pairs.get('pairs'))
 
         conflictive_workers = kwargs.get('conflictive_workers')
-        self.conflicting_workers = pd.DataFrame(
-            data=conflictive_workers.get('pairs'),
-            columns=['worker_a', 'worker_b']
+        self.conflicting_worker_pairs = _as_pairs(
+            conflictive_workers.get('pairs'))
+
+        self._load_eligibility(**kwargs)
+        self._load_payment_tiers(**kwargs)
+        # Probability of every order being cancelled after scheduling
+        self.cancellation_probabilities = np.asarray(
+            kwargs.get('cancellation_probabilities') or [0.0] * self.number_of_orders,
+            dtype=np.float64)
+
+    def _load_payment_tiers(self, **kwargs) -> None:
+        tiers = kwargs.get('payment_tiers') or DEFAULT_PAYMENT_TIERS
+        self.payment_tier_limits = np.array(
+            [limit if limit is not None else np.inf for limit, _ in tiers],
+            dtype=np.float64)
+        self.payment_tier_rates = np.array([rate for _, rate in tiers],
+                                           dtype=np.float64)
+
+    def payment_breakpoints(self) -> tuple:
+        # Breakpoints of the piecewise linear payment: the first order count
+        # of every tier and the payment accumulated up to it
+        breakpoints = np.concatenate([[0.0], self.payment_tier_limits[:-1]])
+        costs = np.concatenate(
+            [[0.0], np.cumsum(np.diff(breakpoints) * self.payment_tier_rates[:-1])])
+        return breakpoints.tolist(), costs.tolist()
+
+    def payments(self, loads: np.ndarray) -> np.ndarray:
+        # Weekly payment of every worker for the given number of orders
+        breakpoints, costs = map(np.asarray, self.payment_breakpoints())
+        tier = np.searchsorted(breakpoints, loads, side='right') - 1
+        return costs[tier] + self.payment_tier_rates[tier] * (loads - breakpoints[tier])
+
+    def _load_eligibility(self, **kwargs) -> None:
+        # Skills: an order can only be done by workers having every skill it
+        # requires. Availability windows restrict the (day, shift) slots of
+        # every worker and order. Missing keys mean no restriction.
+        worker_skills = kwargs.get('worker_skills') or \
+            [[] for _ in range(self.number_of_workers)]
+        order_skills = kwargs.get('order_skills') or \
+            [[] for _ in range(self.number_of_orders)]
+        self.skill_names = np.array(
+            sorted({skill for skills in worker_skills + order_skills for skill in skills}),
+            dtype=np.str_)
+        self.worker_skills = _skills_matrix(worker_skills, self.skill_names)
+        self.order_skills = _skills_matrix(order_skills, self.skill_names)
+
+        self.worker_available = self._slots_matrix(
+            kwargs.get('worker_availability'), self.number_of_workers)
+        self.order_allowed = self._slots_matrix(
+            kwargs.get('order_windows'), self.number_of_orders)
+
+    def _slots_matrix(self, windows: list, size: int) -> np.ndarray:
+        # windows[x] is a list of [day, shift] slots, or None for every slot
+        slots = np.ones((size, self.number_of_days, self.number_of_shifts),
+                        dtype=bool)
+        for element, window in enumerate(windows or []):
+            if window is not None:
+                slots[element] = False
+                for day, shift in window:
+                    slots[element, day, shift] = True
+        return slots
+
+    def _build_indexes(self) -> None:
+        # Adjacency indexes over the pair arrays: for every order the orders
+        # that are linked to it on the next shift, and for every worker the
+        # workers that cannot share an order with it.
+        self.sequential_partners = _build_adjacency(
+            self.sequential_pairs, self.number_of_orders)
+        self.non_consecutive_partners = _build_adjacency(
+            self.non_consecutive_pairs, self.number_of_orders)
+        self.repetitive_partners = _build_adjacency(
+            self.repetitive_pairs, self.number_of_orders)
+        self.conflicting_partners = _build_adjacency(
+            self.conflicting_worker_pairs, self.number_of_workers,
+            symmetric=True)
+
+        # Sparse eligibility: CSR mapping from the flat (order, day, shift)
+        # index to the workers that can be assigned there.
+        eligible = self.eligibility_mask().reshape(-1, self.number_of_workers)
+        self.eligible_workers_indptr = np.concatenate(
+            [[0], np.cumsum(eligible.sum(axis=1))]).astype(np.int64)
+        self.eligible_workers_indices = np.nonzero(eligible)[1].astype(np.int32)
+
+    def eligibility_mask(self) -> np.ndarray:
+        # Boolean (orders, days, shifts, workers) mask of eligible assignments
+        has_skills = ~(self.order_skills[None, :, :]
+                       & ~self.worker_skills[:, None, :]).any(axis=2)
+        return has_skills.T[:, None, None, :] \
+            & self.order_allowed[:, :, :, None] \
+            & self.worker_available.transpose(1, 2, 0)[None, :, :, :]
+
+    def eligible_workers(self, order: int, day: int, shift: int) -> np.ndarray:
+        flat = (order * self.number_of_days + day) * self.number_of_shifts + shift
+        return self.eligible_workers_indices[
+            self.eligible_workers_indptr[flat]:self.eligible_workers_indptr[flat + 1]]
+
+    # DataFrame views, only built (and pandas only imported) when requested
+    @property
+    def orders_data(self):
+        import pandas as pd
+        return pd.DataFrame(
+            data={
+                'order': self.orders,
+                'profit': self.profits,
+                'workers_needed': self.workers_needed
+            }
         )
 
+    @property
+    def sequential_orders_data(self):
+        return _pairs_dataframe(self.sequential_pairs, ORDERS_PAIR_COLUMNS)
+
+    @property
+    def non_consecutive_orders(self):
+        return _pairs_dataframe(self.non_consecutive_pairs, ORDERS_PAIR_COLUMNS)
+
+    @property
+    def repetitive_orders(self):
+        return _pairs_dataframe(self.repetitive_pairs, ORDERS_PAIR_COLUMNS)
+
+    @property
+    def conflicting_workers(self):
+        return _pairs_dataframe(self.conflicting_worker_pairs,
+                                WORKERS_PAIR_COLUMNS)
+
     def print_description(self) -> str:
         print(f"""
         Data from class (is_random: {self.is_random}):
             Number of orders to supply: {self.number_of_orders} 
             Number of workers to set: {self.number_of_workers} 
-            Payments: {len(self.orders_data)} 
-            Number Sequential orders: {len(self.sequential_orders_data)} 
-            Number Non-Sequential orders: {len(self.non_consecutive_orders)} 
-            Number Repetitive orders: {len(self.repetitive_orders)} 
-            Number conflicting workers: {len(self.conflicting_workers)} 
+            Payments: {len(self.profits)} 
+            Number Sequential orders: {len(self.sequential_pairs)} 
+            Number Non-Sequential orders: {len(self.non_consecutive_pairs)} 
+            Number Repetitive orders: {len(self.repetitive_pairs)} 
+            Number conflicting workers: {len(self.conflicting_worker_pairs)} 
         """)
 
     def save_to_json(self, name: str = None) -> None:
@@ -181,28 +332,53 @@ class FieldServiceManagementInstance():
             'is_random': False,
             'number_of_orders': self.number_of_orders,
             'number_of_workers': self.number_of_workers,
-            'payments': self.orders_data.profit.values.tolist(),
-            'workers_per_order': self.orders_data.workers_needed.values.tolist(),
+            'payments': self.profits.tolist(),
+            'workers_per_order': self.workers_needed.tolist(),
             'sequential_orders': {
-                'count': len(self.sequential_orders_data.values.tolist()),
-                'pairs': self.sequential_orders_data.values.tolist()
+                'count': len(self.sequential_pairs.tolist()),
+                'pairs': self.sequential_pairs.tolist()
             },
             'non_seq_orders': {
-                'count': len(self.non_consecutive_orders.values.tolist()),
-                'pairs': self.non_consecutive_orders.values.tolist()
+                'count': len(self.non_consecutive_pairs.tolist()),
+                'pairs': self.non_consecutive_pairs.tolist()
             },
             'repetitive_orders': {
-                'count': len(self.repetitive_orders.values.tolist()),
-                'pairs': self.repetitive_orders.values.tolist()
+                'count': len(self.repetitive_pairs.tolist()),
+                'pairs': self.repetitive_pairs.tolist()
             },
             'conflictive_workers': {
-                'count': len(self.conflicting_workers.values.tolist()),
-                'pairs': self.conflicting_workers.values.tolist()
+                'count': len(self.conflicting_worker_pairs.tolist()),
+                'pairs': self.conflicting_worker_pairs.tolist()
             },
         }
+        data_dict.update(self._eligibility_to_json())
+        tiers = [[None if np.isinf(limit) else int(limit), rate]
+                 for limit, rate in zip(self.payment_tier_limits.tolist(),
+                                        self.payment_tier_rates.tolist())]
+        if tiers != DEFAULT_PAYMENT_TIERS:
+            data_dict['payment_tiers'] = tiers
+        if self.cancellation_probabilities.any():
+            data_dict['cancellation_probabilities'] = self.cancellation_probabilities.tolist()
 
         srsly.write_json(self.data_path/name, data_dict)
 
+    def _eligibility_to_json(self) -> dict:
+        # Only the restrictions actually present are written
+        data_dict = {}
+        if len(self.skill_names):
+            data_dict['worker_skills'] = [
+                self.skill_names[row].tolist() for row in self.worker_skills]
+            data_dict['order_skills'] = [
+                self.skill_names[row].tolist() for row in self.order_skills]
+        for key, slots in [('worker_availability', self.worker_available),
+                           ('order_windows', self.order_allowed)]:
+            if not slots.all():
+                data_dict[key] = [
+                    np.argwhere(window).tolist() if not window.all() else None
+                    for window in slots
+                ]
+        return data_dict
+
 
 if __name__ == "__main__":
     test_class = FieldServiceManagementInstance(file='test.json')
@@ -0,0 +1,303 @@
+import hashlib
+import json
+import os
+
+from pathlib import Path
+
+
+CACHE_VERSION = 5
+
+PAIRS_SECTIONS = {
+    'sequential_orders': 'orders',
+    'non_seq_orders': 'orders',
+    'repetitive_orders': 'orders',
+    'conflictive_workers': 'workers',
+}
+
+# Arrays stored in the binary cache, by instance attribute name
+CACHED_ARRAYS = [
+    'profits',
+    'workers_needed',
+    'sequential_pairs',
+    'non_consecutive_pairs',
+    'repetitive_pairs',
+    'conflicting_worker_pairs',
+    'skill_names',
+    'worker_skills',
+    'order_skills',
+    'worker_available',
+    'order_allowed',
+    'payment_tier_limits',
+    'payment_tier_rates',
+    'cancellation_probabilities',
+]
+
+
+class InstanceValidationError(ValueError):
+    def __init__(self, file_path, errors: list) -> None:
+        self.file_path = file_path
+        self.errors = errors
+        message = '\n'.join(f'  - {error}' for error in errors)
+        super().__init__(f'Invalid instance file {file_path}:\n{message}')
+
+
+def _is_int(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _check_positive_int(data: dict, key: str, errors: list, required: bool = True) -> None:
+    if key not in data:
+        if required:
+            errors.append(f'missing key "{key}"')
+        return
+    if not _is_int(data[key]) or data[key] <= 0:
+        errors.append(f'"{key}" should be a positive integer, got {data[key]!r}')
+
+
+def _check_pairs(data: dict, key: str, size: int, errors: list) -> None:
+    section = data.get(key)
+    if section is None:
+        errors.append(f'missing key "{key}"')
+        return
+    if not isinstance(section, dict) or not isinstance(section.get('pairs'), list):
+        errors.append(f'"{key}" should be an object with a "pairs" list')
+        return
+
+    pairs = section['pairs']
+    if 'count' in section and section['count'] != len(pairs):
+        errors.append(
+            f'"{key}.count" is {section["count"]} but {len(pairs)} pairs are listed')
+
+    seen = set()
+    for position, pair in enumerate(pairs):
+        if not isinstance(pair, list) or len(pair) != 2 \
+                or not all(_is_int(value) for value in pair):
+            errors.append(
+                f'"{key}.pairs[{position}]" should be a pair of integers, got {pair!r}')
+            continue
+        if size is not None and not all(0 <= value < size for value in pair):
+            errors.append(
+                f'"{key}.pairs[{position}]" = {pair} is out of range [0, {size})')
+        if pair[0] == pair[1]:
+            errors.append(
+                f'"{key}.pairs[{position}]" = {pair} pairs an element with itself')
+        if tuple(pair) in seen:
+            errors.append(f'"{key}.pairs[{position}]" = {pair} is duplicated')
+        seen.add(tuple(pair))
+
+
+def _check_per_order_list(data: dict, key: str, number_of_orders: int, errors: list,
+                          minimum: float, required: bool = True,
+                          maximum: float = None) -> None:
+    if key not in data:
+        if required:
+            errors.append(f'missing key "{key}"')
+        return
+    values = data[key]
+    if _is_int(values) and key == 'workers_per_order':
+        values = [values]
+    elif not isinstance(values, list):
+        errors.append(f'"{key}" should be a list, got {type(values).__name__}')
+        return
+    elif number_of_orders is not None and len(values) != number_of_orders:
+        errors.append(
+            f'"{key}" has {len(values)} values but number_of_orders is {number_of_orders}')
+
+    for position, value in enumerate(values):
+        if not isinstance(value, (int, float)) or isinstance(value, bool) \
+                or value < minimum:
+            errors.append(
+                f'"{key}[{position}]" should be a number >= {minimum}, got {value!r}')
+        elif maximum is not None and value > maximum:
+            errors.append(
+                f'"{key}[{position}]" should be a number <= {maximum}, got {value!r}')
+
+
+def _check_skills(data: dict, key: str, size: int, errors: list) -> None:
+    if key not in data:
+        return
+    skills = data[key]
+    if not isinstance(skills, list) or (size is not None and len(skills) != size):
+        errors.append(f'"{key}" should be a list with {size} lists of skills')
+        return
+    for position, element_skills in enumerate(skills):
+        if not isinstance(element_skills, list) \
+                or not all(isinstance(skill, str) for skill in element_skills):
+            errors.append(f'"{key}[{position}]" should be a list of skill names')
+
+
+def _check_windows(data: dict, key: str, size: int, errors: list,
+                   number_of_days: int, number_of_shifts: int) -> None:
+    if key not in data:
+        return
+    windows = data[key]
+    if not isinstance(windows, list) or (size is not None and len(windows) != size):
+        errors.append(f'"{key}" should be a list with {size} windows (or null)')
+        return
+    for position, window in enumerate(windows):
+        if window is None:
+            continue
+        if not isinstance(window, list):
+            errors.append(f'"{key}[{position}]" should be a list of [day, shift] or null')
+            continue
+        for slot in window:
+            if not isinstance(slot, list) or len(slot) != 2 \
+                    or not all(_is_int(value) for value in slot) \
+                    or not 0 <= slot[0] < number_of_days \
+                    or not 0 <= slot[1] < number_of_shifts:
+                errors.append(
+                    f'"{key}[{position}]" has an invalid slot {slot!r}, expected '
+                    f'[day, shift] with day < {number_of_days} and shift < {number_of_shifts}')
+
+
+def _check_payment_tiers(data: dict, errors: list) -> None:
+    if 'payment_tiers' not in data:
+        return
+    tiers = data['payment_tiers']
+    if not isinstance(tiers, list) or not tiers:
+        errors.append('"payment_tiers" should be a non empty list of [limit, rate]')
+        return
+    previous = 0
+    for position, tier in enumerate(tiers):
+        last = position == len(tiers) - 1
+        if not isinstance(tier, list) or len(tier) != 2 \
+                or not isinstance(tier[1], (int, float)) or isinstance(tier[1], bool):
+            errors.append(f'"payment_tiers[{position}]" should be [limit, rate], got {tier!r}')
+            continue
+        limit = tier[0]
+        if last and limit is not None:
+            errors.append('the last of "payment_tiers" should have a null limit')
+        elif not last and (not _is_int(limit) or limit <= previous):
+            errors.append(f'"payment_tiers[{position}]" limit should be an integer '
+                          f'greater than {previous}, got {limit!r}')
+        else:
+            previous = limit
+
+
+def validate_problem_data(data: dict, file_path=None,
+                          number_of_days: int = 6, number_of_shifts: int = 5) -> None:
+    # Checks the instance schema before anything is loaded, raising
+    # InstanceValidationError with every problem found.
+    if not isinstance(data, dict):
+        raise InstanceValidationError(
+            file_path, ['the instance should be a JSON object'])
+
+    errors = []
+    _check_positive_int(data, 'number_of_orders', errors)
+    _check_positive_int(data, 'number_of_workers', errors)
+
+    if data.get('is_random'):
+        _check_positive_int(data, 'max_payment_per_order', errors)
+    else:
+        number_of_orders = data.get('number_of_orders') \
+            if _is_int(data.get('number_of_orders')) else None
+        number_of_workers = data.get('number_of_workers') \
+            if _is_int(data.get('number_of_workers')) else None
+
+        _check_per_order_list(data, 'payments', number_of_orders, errors,
+                              minimum=0)
+        _check_per_order_list(data, 'workers_per_order', number_of_orders, errors,
+                              minimum=1, required=False)
+        for key, kind in PAIRS_SECTIONS.items():
+            size = number_of_orders if kind == 'orders' else number_of_workers
+            _check_pairs(data, key, size, errors)
+
+        _check_skills(data, 'worker_skills', number_of_workers, errors)
+        _check_skills(data, 'order_skills', number_of_orders, errors)
+        _check_windows(data, 'worker_availability', number_of_workers, errors,
+                       number_of_days, number_of_shifts)
+        _check_windows(data, 'order_windows', number_of_orders, errors,
+                       number_of_days, number_of_shifts)
+        _check_payment_tiers(data, errors)
+        _check_per_order_list(data, 'cancellation_probabilities', number_of_orders, errors,
+                              minimum=0, required=False, maximum=1)
+
+    if errors:
+        raise InstanceValidationError(file_path, errors)
+
+
+# numpy is only imported to read and write the cache, so validating an
+# instance stays cheap
+def read_problem_data(file_path: Path) -> dict:
+    try:
+        with open(file_path, encoding='utf8') as file:
+            data = json.load(file)
+    except ValueError as error:
+        raise InstanceValidationError(
+            file_path, [f'could not parse JSON: {error}']) from error
+    validate_problem_data(data, file_path)
+    return data
+
+
+# Binary cache: a <name>.cache folder next to the JSON file with one .npy per
+# array and a meta.json. Arrays are memory-mapped when loaded, so big
+# instances skip the JSON parsing and only the pages used are read.
+CACHE_META = 'meta.json'
+
+
+def cache_path_for(file_path: Path) -> Path:
+    return Path(file_path).with_suffix('.cache')
+
+
+def _file_digest(file_path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_cached_instance(file_path: Path):
+    # Returns the cached arrays as a dict, or None if there is no valid cache.
+    # The cache is trusted when mtime and size match the JSON file; otherwise
+    # its content hash decides.
+    import numpy as np
+
+    cache_path = cache_path_for(file_path)
+    if not (cache_path/CACHE_META).exists():
+        return None
+    try:
+        stat = os.stat(file_path)
+        with open(cache_path/CACHE_META) as file:
+            meta = json.load(file)
+        if meta['cache_version'] != CACHE_VERSION:
+            return None
+        if meta['source_mtime_ns'] != stat.st_mtime_ns \
+                or meta['source_size'] != stat.st_size:
+            if meta['source_sha256'] != _file_digest(file_path):
+                return None
+        cached = {name: np.load(cache_path/f'{name}.npy', mmap_mode='r',
+                                allow_pickle=False)
+                  for name in CACHED_ARRAYS}
+        cached['number_of_orders'] = meta['number_of_orders']
+        cached['number_of_workers'] = meta['number_of_workers']
+    except (OSError, KeyError, ValueError):
+        return None
+    return cached
+
+
+def save_instance_cache(file_path: Path, instance) -> None:
+    import numpy as np
+
+    cache_path = cache_path_for(file_path)
+    stat = os.stat(file_path)
+    meta = {
+        'cache_version': CACHE_VERSION,
+        'source_mtime_ns': stat.st_mtime_ns,
+        'source_size': stat.st_size,
+        'source_sha256': _file_digest(file_path),
+        'number_of_orders': int(instance.number_of_orders),
+        'number_of_workers': int(instance.number_of_workers),
+    }
+    try:
+        cache_path.mkdir(exist_ok=True)
+        # meta.json is written last, so a cache left half written is ignored
+        (cache_path/CACHE_META).unlink(missing_ok=True)
+        for name in CACHED_ARRAYS:
+            np.save(cache_path/f'{name}.npy', np.asarray(getattr(instance, name)),
+                    allow_pickle=False)
+        with open(cache_path/CACHE_META, 'w') as file:
+            json.dump(meta, file)
+    except OSError:
+        # A read-only input folder should not prevent solving
+        pass
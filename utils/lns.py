@@ -0,0 +1,168 @@
+import cplex
+import numpy as np
+import srsly
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from utils.two_stage import assignment_tensor, schedule_objective
+from utils.verifier import verify_schedule
+
+
+NEIGHBOURHOODS = ['days', 'workers', 'orders']
+
+# Model of the worker process, built once and reused for every neighbourhood
+_model = {}
+
+
+def load_schedule(orders_schedule_path: Path) -> dict:
+    # Reads an orders_schedule.json written by parse_results (or
+    # write_assignments) as {(order, day, shift): [workers]}, 0-based
+    orders_schedule = srsly.read_json(orders_schedule_path)
+    return {
+        (int(order.split('_')[1]), row['day'] - 1, row['shift'] - 1):
+            [int(worker.split('_')[1]) for worker in row['workers_involved']]
+        for order, row in orders_schedule.items()
+    }
+
+
+def _init_model(data, impossible_orders) -> None:
+    from solver import populate_by_row
+
+    my_problem = cplex.Cplex()
+    my_problem.set_log_stream(None)
+    my_problem.set_results_stream(None)
+    my_problem.set_warning_stream(None)
+    my_problem.parameters.threads.set(1)
+    variables = populate_by_row(my_problem, data, impossible_orders,
+                                write_lp=False, verbose=False)
+    _model.update(problem=my_problem, variables=variables, data=data)
+
+
+def sample_neighbourhood(data, rng, size: float = 0.3) -> tuple:
+    # A random subset of days, workers or orders that will be re-optimized
+    kind = NEIGHBOURHOODS[rng.integers(len(NEIGHBOURHOODS))]
+    total = {'days': data.number_of_days,
+             'workers': data.number_of_workers,
+             'orders': data.number_of_orders}[kind]
+    chosen = rng.choice(total, size=max(1, int(round(total * size))), replace=False)
+    return kind, sorted(chosen.tolist())
+
+
+def mip_start(data, variables, incumbent: dict) -> cplex.SparsePair:
+    # Values of every variable of the model for the incumbent: O from the
+    # placements, T from the workers, alpha from the days worked, N from the
+    # loads and P from the payment tiers
+    values = {index[0]: 0.0 for index in variables['orders'].values()}
+    values.update((index[0], 0.0) for index in variables['worker'].values())
+    loads = np.zeros(data.number_of_workers)
+    days = np.zeros((data.number_of_workers, data.number_of_days), dtype=bool)
+    for (i, j, k), workers in incumbent.items():
+        # placements the model does not have leave the start to be repaired
+        if (i, j, k) in variables['orders']:
+            values[variables['orders'][i, j, k][0]] = 1.0
+        for n in workers:
+            if (n, i, j, k) in variables['worker']:
+                values[variables['worker'][n, i, j, k][0]] = 1.0
+        loads[workers] += 1
+        days[workers, j] = True
+    payments = data.payments(loads)
+    for (n, j), index in variables['alphas'].items():
+        values[index[0]] = float(days[n, j])
+    for n in range(data.number_of_workers):
+        values[variables['payments_count'][n][0]] = float(loads[n])
+        values[variables['payments'][n][0]] = float(payments[n])
+    return cplex.SparsePair(ind=list(values), val=list(values.values()))
+
+
+def solve_neighbourhood(incumbent: dict, neighbourhood: tuple, time_limit: float):
+    # Fixes every T variable outside the neighbourhood to its incumbent value,
+    # starts from the whole incumbent and re-solves the sub-MIP. Returns the
+    # objective and the new schedule, or None if nothing was found.
+    my_problem = _model['problem']
+    worker_vars = _model['variables']['worker']
+    kind, chosen = neighbourhood
+    chosen = set(chosen)
+    position = {'days': 2, 'workers': 0, 'orders': 1}[kind]
+
+    assigned = {(n, i, j, k) for (i, j, k), workers in incumbent.items() for n in workers}
+    bounds = []
+    for key, index in worker_vars.items():
+        value = 1.0 if key in assigned else 0.0
+        if key[position] in chosen:
+            bounds.append((index[0], 0.0, 1.0))
+        else:
+            bounds.append((index[0], value, value))
+    my_problem.variables.set_lower_bounds([(i, lb) for i, lb, _ in bounds])
+    my_problem.variables.set_upper_bounds([(i, ub) for i, _, ub in bounds])
+
+    my_problem.MIP_starts.delete()
+    # repair only does work if the start is rejected
+    my_problem.MIP_starts.add(mip_start(_model['data'], _model['variables'], incumbent),
+                              my_problem.MIP_starts.effort_level.repair)
+    my_problem.parameters.timelimit.set(time_limit)
+    my_problem.solve()
+
+    if my_problem.solution.get_solution_type() == my_problem.solution.type.none:
+        return None
+    values = my_problem.solution.get_values([index[0] for index in worker_vars.values()])
+    schedule = {}
+    for (n, i, j, k), value in zip(worker_vars, values):
+        if value > 0.5:
+            schedule.setdefault((i, j, k), []).append(n)
+    return my_problem.solution.get_objective_value(), schedule
+
+
+def improve_schedule(data, incumbent: dict, time_budget: float = 60.0,
+                     neighbourhood_time: float = 5.0, size: float = 0.3,
+                     processes: int = 4, impossible_orders=(), seed: int = 42,
+                     max_stall: int = 50) -> dict:
+    # Large neighbourhood search: every round solves `processes` random
+    # neighbourhoods of the incumbent in parallel and keeps the best one.
+    # It stops when the time budget is spent or after `max_stall` rounds
+    # without improvement.
+    rng = np.random.default_rng(seed)
+    report = verify_schedule(data, assignment_tensor(data, incumbent))
+    if not report.is_valid:
+        # every neighbourhood keeps the rest of the schedule, so the sub-MIPs
+        # can only be feasible around the broken rules
+        print('Warning: the LNS starts from a schedule that breaks rules of the model')
+        report.print_report()
+    best = schedule_objective(data, incumbent)
+    started = time.monotonic()
+    log = []
+    print(f'LNS start: objective {best:.1f}, budget {time_budget:.0f}s')
+
+    with ProcessPoolExecutor(max_workers=processes, initializer=_init_model,
+                             initargs=(data, impossible_orders)) as pool:
+        rounds = stall = 0
+        while time.monotonic() - started < time_budget and stall < max_stall:
+            # the last round is shortened to end within the budget
+            time_limit = min(neighbourhood_time,
+                             time_budget - (time.monotonic() - started))
+            rounds += 1
+            neighbourhoods = [sample_neighbourhood(data, rng, size)
+                              for _ in range(processes)]
+            results = list(pool.map(solve_neighbourhood,
+                                    [incumbent] * processes, neighbourhoods,
+                                    [time_limit] * processes))
+            found = [(result[0], result[1], neighbourhood)
+                     for result, neighbourhood in zip(results, neighbourhoods)
+                     if result is not None]
+            improved = False
+            if found:
+                objective, schedule, neighbourhood = max(found, key=lambda r: r[0])
+                if objective > best + 1e-6:
+                    best, incumbent, improved = objective, schedule, True
+            stall = 0 if improved else stall + 1
+            elapsed = time.monotonic() - started
+            log.append({'round': rounds, 'elapsed': round(elapsed, 2),
+                        'objective': best, 'improved': improved})
+            if improved:
+                print(f'LNS round {rounds} ({elapsed:.1f}s): objective {best:.1f} '
+                      f'freeing {neighbourhood[0]} {neighbourhood[1]}')
+
+    print(f'LNS end: objective {best:.1f} after {rounds} rounds '
+          f'({time.monotonic() - started:.1f}s)')
+    return {'assignments': incumbent, 'objective': best, 'log': log}
@@ -0,0 +1,70 @@
+import resource
+import sys
+import time
+
+from contextlib import contextmanager
+from pathlib import Path
+
+
+# CPLEX settings of the memory-bounded mode: node files are written to disk
+# (compressed) once the branch-and-bound tree exceeds WORKMEM megabytes
+WORKMEM = 2048
+NODE_FILE_TO_DISK_COMPRESSED = 3
+
+
+def configure_low_memory(my_problem, workmem: int = WORKMEM,
+                         workdir: Path = Path('output_data')) -> None:
+    # CPLEX does not create the folder of its node files
+    workdir = Path(workdir)
+    workdir.mkdir(parents=True, exist_ok=True)
+    my_problem.parameters.emphasis.memory.set(1)
+    my_problem.parameters.workmem.set(workmem)
+    my_problem.parameters.workdir.set(str(workdir))
+    my_problem.parameters.mip.strategy.file.set(NODE_FILE_TO_DISK_COMPRESSED)
+
+
+def _reset_peak() -> None:
+    # Linux resets the peak resident set size (VmHWM) of the process when 5
+    # is written to clear_refs. Elsewhere the peak is the one of the process.
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+    except OSError:
+        pass
+
+
+def peak_memory_mb() -> float:
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+
+class MemoryReport():
+    # Peak resident memory (CPLEX included) and duration of every phase of
+    # a run
+    def __init__(self) -> None:
+        self.phases = []
+
+    @contextmanager
+    def phase(self, name: str):
+        _reset_peak()
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.phases.append({'phase': name,
+                                'peak_mb': round(peak_memory_mb(), 1),
+                                'seconds': round(time.monotonic() - started, 2)})
+
+    def print_report(self) -> None:
+        print('Peak memory per phase:')
+        for phase in self.phases:
+            print(f'    {phase["phase"]}: {phase["peak_mb"]:.1f} MB '
+                  f'({phase["seconds"]:.2f}s)')
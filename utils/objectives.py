@@ -0,0 +1,154 @@
+import cplex
+import itertools
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+
+
+# Every objective is maximized, like the profit of the base model:
+#   profit:       \sum_{ijk} O_{ijk} p_i - \sum_n P^n
+#   fairness:     -(N_max - N_min), the spread of orders between workers
+#   working_days: -\sum_{nj} \alpha^n_j
+OBJECTIVES = ['profit', 'fairness', 'working_days']
+# Weighted mode: one order of spread or one working day weigh as much as this
+# profit
+DEFAULT_WEIGHTS = {'profit': 1.0, 'fairness': 100.0, 'working_days': 10.0}
+# Lexicographic mode: higher priorities are optimized first
+DEFAULT_PRIORITIES = {'profit': 2, 'fairness': 1, 'working_days': 0}
+# Weights of fairness and working days tried by the Pareto sweep
+PARETO_WEIGHTS = [0.0, 10.0, 100.0, 1000.0]
+
+
+def add_fairness_variables(my_problem, data, variables, names: bool = True) -> dict:
+    # N_max and N_min bound the number of orders of every worker:
+    # N_min \leq N[n] \leq N_max \; \forall n
+    bounds = {}
+    for bound in ['max', 'min']:
+        bounds[bound] = my_problem.variables.add(
+            obj=[0.0],
+            lb=[0],
+            ub=[data.number_of_orders],
+            types=[my_problem.variables.type.integer],
+            names=[f'N_{bound}'] if names else None
+        )
+
+    c_iter = 0
+    for n in range(data.number_of_workers):
+        c_iter += 1
+        count = list(variables['payments_count'][n])[0]
+        my_problem.linear_constraints.add(
+            lin_expr=[cplex.SparsePair(ind=[count, bounds['max'][0]], val=[1.0, -1.0]),
+                      cplex.SparsePair(ind=[count, bounds['min'][0]], val=[1.0, -1.0])],
+            senses=["L", "G"],
+            rhs=[0.0, 0.0],
+            names=[f'c_fairness_max#{c_iter}', f'c_fairness_min#{c_iter}'] if names else None
+        )
+    variables['fairness'] = bounds
+    return bounds
+
+
+def objective_terms(my_problem, variables) -> dict:
+    # Linear expression (indices, coefficients) of every objective. The
+    # profit is the objective already loaded by create_variables.
+    profit = [(index, value)
+              for index, value in enumerate(my_problem.objective.get_linear())
+              if value != 0.0]
+    bounds = variables['fairness']
+    alphas = [list(index)[0] for index in variables['alphas'].values()]
+    return {
+        'profit': ([i for i, _ in profit], [v for _, v in profit]),
+        'fairness': ([bounds['max'][0], bounds['min'][0]], [-1.0, 1.0]),
+        'working_days': (alphas, [-1.0] * len(alphas)),
+    }
+
+
+def set_multiobjective(my_problem, terms: dict, mode: str = 'lexicographic',
+                       weights: dict = None, priorities: dict = None,
+                       reltol: dict = None) -> None:
+    # Loads the objectives with the CPLEX multi-objective API.
+    # - weighted: every objective has the same priority and CPLEX solves the
+    #   blend \sum w_o f_o.
+    # - lexicographic: objectives are optimized by decreasing priority, each
+    #   one without degrading the previous ones beyond their relative
+    #   tolerance. CPLEX starts every priority level from the solution of the
+    #   previous one.
+    if mode not in ('weighted', 'lexicographic'):
+        raise ValueError(f'Unknown multi-objective mode {mode!r}')
+    weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+    priorities = {**DEFAULT_PRIORITIES, **(priorities or {})}
+    reltol = reltol or {}
+
+    my_problem.multiobj.set_num(len(OBJECTIVES))
+    for objidx, name in enumerate(OBJECTIVES):
+        ind, val = terms[name]
+        my_problem.multiobj.set_definition(
+            objidx=objidx,
+            obj=cplex.SparsePair(ind=ind, val=val),
+            weight=weights[name],
+            priority=priorities[name] if mode == 'lexicographic' else 0,
+            abstol=0.0,
+            reltol=reltol.get(name, 0.0),
+            name=name
+        )
+
+
+def objective_values(my_problem, terms: dict) -> dict:
+    values = my_problem.solution.get_values()
+    return {name: sum(values[i] * v for i, v in zip(*terms[name]))
+            for name in OBJECTIVES}
+
+
+def _solve_variant(data, impossible_orders, weights: dict, time_limit: float):
+    from solver import populate_by_row
+
+    my_problem = cplex.Cplex()
+    my_problem.set_log_stream(None)
+    my_problem.set_results_stream(None)
+    my_problem.set_warning_stream(None)
+    my_problem.parameters.threads.set(1)
+    my_problem.parameters.timelimit.set(time_limit)
+    variables = populate_by_row(my_problem, data, impossible_orders,
+                                write_lp=False, verbose=False)
+    add_fairness_variables(my_problem, data, variables)
+    terms = objective_terms(my_problem, variables)
+    set_multiobjective(my_problem, terms, 'weighted', weights=weights)
+    my_problem.solve()
+    if my_problem.solution.get_solution_type() == my_problem.solution.type.none:
+        return None
+    return objective_values(my_problem, terms)
+
+
+def pareto_sweep(data, impossible_orders=(), pareto_weights=PARETO_WEIGHTS,
+                 processes: int = None, time_limit: float = 60.0) -> list:
+    # Solves the weighted model for every combination of fairness and working
+    # days weights in parallel, and flags the non-dominated points
+    variants = [{'profit': 1.0, 'fairness': fairness, 'working_days': days}
+                for fairness, days in itertools.product(pareto_weights, repeat=2)]
+    with ProcessPoolExecutor(max_workers=processes or os.cpu_count()) as pool:
+        results = list(pool.map(_solve_variant,
+                                [data] * len(variants),
+                                [impossible_orders] * len(variants),
+                                variants,
+                                [time_limit] * len(variants)))
+
+    points = [{'weights': weights, 'objectives': values}
+              for weights, values in zip(variants, results) if values is not None]
+    for point in points:
+        point['dominated'] = any(
+            all(other['objectives'][o] >= point['objectives'][o] - 1e-6 for o in OBJECTIVES)
+            and any(other['objectives'][o] > point['objectives'][o] + 1e-6 for o in OBJECTIVES)
+            for other in points)
+    return points
+
+
+def print_pareto_front(points: list) -> None:
+    print('Pareto front (profit, fairness, working days):')
+    printed = set()
+    for point in points:
+        values = point['objectives']
+        key = tuple(round(values[o], 6) for o in OBJECTIVES)
+        if point['dominated'] or key in printed:
+            continue
+        printed.add(key)
+        print(f'    {values["profit"]:.1f}, {values["fairness"]:.0f}, '
+              f'{values["working_days"]:.0f}  weights {point["weights"]}')
@@ -0,0 +1,170 @@
+import gzip
+import srsly
+
+from collections import defaultdict
+from pathlib import Path
+
+
+FORMATS = ['jsonl', 'parquet']
+CODECS = [None, 'gzip', 'zstd']
+EXTENSIONS = {
+    ('jsonl', None): '.jsonl',
+    ('jsonl', 'gzip'): '.jsonl.gz',
+    ('jsonl', 'zstd'): '.jsonl.zst',
+    ('parquet', None): '.parquet',
+    ('parquet', 'gzip'): '.parquet',
+    ('parquet', 'zstd'): '.parquet',
+}
+# Keys of the rows that are indexed for random access
+INDEXED_KEYS = ['worker', 'day']
+
+
+def _compress(data: bytes, codec: str) -> bytes:
+    # Every chunk is compressed on its own: the file is still a valid
+    # multi-member gzip / multi-frame zstd stream, and any chunk can be
+    # decompressed alone from its offset.
+    if codec == 'gzip':
+        return gzip.compress(data)
+    if codec == 'zstd':
+        import zstandard
+        return zstandard.ZstdCompressor().compress(data)
+    return data
+
+
+def _decompress(data: bytes, codec: str) -> bytes:
+    if codec == 'gzip':
+        return gzip.decompress(data)
+    if codec == 'zstd':
+        import zstandard
+        return zstandard.ZstdDecompressor().decompress(data)
+    return data
+
+
+class ScheduleWriter():
+    # Streams schedule rows (flat dicts) to disk in chunks, as JSON Lines or
+    # Parquet row groups, so the full schedule is never held in memory.
+    #
+    # Next to the data file an index (`<name>.index.json`) lists every chunk
+    # (byte offset and length, or row group) and, for every worker and day,
+    # the chunks holding its rows.
+    def __init__(self, output_path: Path, name: str, output_format: str = 'jsonl',
+                 codec: str = None, chunk_rows: int = 10000) -> None:
+        if output_format not in FORMATS:
+            raise ValueError(f'Unknown schedule format {output_format!r}, '
+                             f'expected one of {FORMATS}')
+        if codec not in CODECS:
+            raise ValueError(f'Unknown codec {codec!r}, expected one of {CODECS}')
+
+        self.output_format = output_format
+        self.codec = codec
+        self.chunk_rows = chunk_rows
+        self.path = Path(output_path)/f'{name}{EXTENSIONS[output_format, codec]}'
+        self.index_path = Path(output_path)/f'{name}.index.json'
+
+        self._rows = []
+        self._chunks = []
+        self._index = {key: defaultdict(set) for key in INDEXED_KEYS}
+        self._file = None
+        self._parquet_writer = None
+
+    def __enter__(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if self.output_format == 'jsonl':
+            self._file = open(self.path, 'wb')
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def write(self, row: dict) -> None:
+        self._rows.append(row)
+        if len(self._rows) >= self.chunk_rows:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._rows:
+            return
+        chunk = len(self._chunks)
+        for key in INDEXED_KEYS:
+            for row in self._rows:
+                if key in row:
+                    self._index[key][row[key]].add(chunk)
+
+        if self.output_format == 'jsonl':
+            data = _compress(
+                ''.join(srsly.json_dumps(row) + '\n' for row in self._rows).encode('utf8'),
+                self.codec)
+            self._chunks.append({'offset': self._file.tell(),
+                                 'length': len(data),
+                                 'rows': len(self._rows)})
+            self._file.write(data)
+        else:
+            self._write_row_group()
+        self._rows = []
+
+    def _write_row_group(self) -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.Table.from_pylist(self._rows)
+        if self._parquet_writer is None:
+            self._parquet_writer = pq.ParquetWriter(
+                self.path, table.schema, compression=self.codec or 'none')
+        self._parquet_writer.write_table(table, row_group_size=len(self._rows))
+        self._chunks.append({'row_group': len(self._chunks),
+                             'rows': len(self._rows)})
+
+    def close(self) -> None:
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+            self._parquet_writer = None
+
+        srsly.write_json(self.index_path, {
+            'file': self.path.name,
+            'format': self.output_format,
+            'codec': self.codec,
+            'chunks': self._chunks,
+            **{
+                key: {str(value): sorted(chunks) for value, chunks in index.items()}
+                for key, index in self._index.items()
+            }
+        })
+
+
+def read_schedule(index_path: Path, **filters):
+    # Yields the rows of a streamed schedule. Filtering by an indexed key
+    # (e.g. worker=3 or day=2) only reads the chunks holding those rows.
+    index_path = Path(index_path)
+    index = srsly.read_json(index_path)
+    data_path = index_path.parent/index['file']
+
+    chunks = range(len(index['chunks']))
+    for key, value in filters.items():
+        if key in INDEXED_KEYS:
+            chunks = [c for c in chunks if c in set(index[key].get(str(value), []))]
+
+    if index['format'] == 'parquet':
+        import pyarrow.parquet as pq
+        parquet_file = pq.ParquetFile(data_path)
+        rows = (row for chunk in chunks
+                for row in parquet_file.read_row_group(chunk).to_pylist())
+    else:
+        rows = _read_jsonl_chunks(data_path, index, chunks)
+
+    for row in rows:
+        if all(row.get(key) == value for key, value in filters.items()):
+            yield row
+
+
+def _read_jsonl_chunks(data_path: Path, index: dict, chunks):
+    with open(data_path, 'rb') as file:
+        for chunk in chunks:
+            location = index['chunks'][chunk]
+            file.seek(location['offset'])
+            data = _decompress(file.read(location['length']), index['codec'])
+            for line in data.decode('utf8').splitlines():
+                yield srsly.json_loads(line)
@@ -0,0 +1,93 @@
+import numpy as np
+
+from collections import defaultdict
+
+
+class OrderPlacements():
+    # Order placements (order, day, shift) grouped by the sequential pairs.
+    #
+    # A sequential pair (a, b) forces O[a][j][k] == O[b][j][k+1] for every
+    # day j and shift k, and forbids a on the last shift. Instead of writing
+    # those rows, every placement linked by them is merged into a single
+    # group: a whole chain a -> b -> c placed at a given start shift is one
+    # decision. Groups that can never be selected are marked as dead:
+    #   - a member of the chain would fall after the last shift
+    #   - the group places the same order twice (sequential cycles)
+    #   - one of its orders is known to be impossible beforehand
+    #   - one of its orders is outside its window, or has fewer eligible
+    #     workers than needed at that slot
+    def __init__(self, data, impossible_orders=()) -> None:
+        self.number_of_orders = data.number_of_orders
+        self.number_of_days = data.number_of_days
+        self.number_of_shifts = data.number_of_shifts
+        self._parent = {}
+
+        for order_a, order_b in data.sequential_pairs.tolist():
+            for j in range(data.number_of_days):
+                for k in range(data.number_of_shifts - 1):
+                    self._union((order_a, j, k), (order_b, j, k + 1))
+
+        members = defaultdict(list)
+        for i in range(data.number_of_orders):
+            for j in range(data.number_of_days):
+                for k in range(data.number_of_shifts):
+                    members[self._find((i, j, k))].append((i, j, k))
+
+        last_shift = data.number_of_shifts - 1
+        eligible_workers = np.diff(data.eligible_workers_indptr).reshape(
+            data.number_of_orders, data.number_of_days, data.number_of_shifts)
+        staffed = eligible_workers >= data.workers_needed[:, None, None]
+        has_successor = {order_a for order_a, _ in data.sequential_pairs.tolist()}
+        impossible_orders = set(impossible_orders)
+
+        self.groups = []
+        self.group_of = {}
+        self.dead = set()
+        for keys in members.values():
+            group = len(self.groups)
+            keys = sorted(keys, key=lambda key: (key[2], key[0]))
+            self.groups.append(keys)
+            orders = [key[0] for key in keys]
+            if len(set(orders)) < len(orders) \
+                    or any(i in has_successor and k == last_shift for i, _, k in keys) \
+                    or impossible_orders.intersection(orders) \
+                    or not all(staffed[key] for key in keys):
+                self.dead.add(group)
+            for key in keys:
+                self.group_of[key] = group
+
+    def _find(self, key):
+        root = key
+        while self._parent.get(root, root) != root:
+            root = self._parent[root]
+        while key != root:
+            self._parent[key], key = root, self._parent.get(key, key)
+        return root
+
+    def _union(self, key_a, key_b) -> None:
+        root_a, root_b = self._find(key_a), self._find(key_b)
+        if root_a != root_b:
+            self._parent[root_b] = root_a
+
+    def alive_groups(self):
+        for group, keys in enumerate(self.groups):
+            if group not in self.dead:
+                yield group, keys
+
+    def alive_mask(self) -> np.ndarray:
+        # Boolean (orders, days, shifts) mask of the selectable placements
+        mask = np.zeros((self.number_of_orders, self.number_of_days,
+                         self.number_of_shifts), dtype=bool)
+        for group, keys in self.alive_groups():
+            for key in keys:
+                mask[key] = True
+        return mask
+
+    def is_alive(self, order: int, day: int, shift: int) -> bool:
+        return self.group_of[order, day, shift] not in self.dead
+
+    def print_summary(self) -> None:
+        placements = len(self.group_of)
+        alive = len(self.groups) - len(self.dead)
+        print(f'Order placements: {placements} merged into {len(self.groups)} '
+              f'groups ({alive} selectable, {len(self.dead)} fixed to 0)')
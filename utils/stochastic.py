@@ -0,0 +1,161 @@
+import cplex
+import numpy as np
+import os
+
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+
+# Cancellation scenarios in the sample-average model and in the evaluation
+# of a schedule (split in chunks solved in parallel)
+MODEL_SCENARIOS = 20
+EVALUATION_SCENARIOS = 10000
+CHUNK_SCENARIOS = 1000
+
+
+def sample_cancellations(data, scenarios: int, rng) -> np.ndarray:
+    # (scenarios, orders) boolean matrix, True where the order is cancelled
+    return rng.random((scenarios, data.number_of_orders)) < data.cancellation_probabilities
+
+
+def load_sample_average(my_problem, data, variables, cancelled: np.ndarray,
+                        names: bool = True) -> dict:
+    # Turns the model into its sample-average version over the given
+    # cancellation scenarios. The schedule (O and T) is decided once; in every
+    # scenario s a cancelled order is neither paid to the company nor to its
+    # workers:
+    #   N_s[n] = \sum_{ijk, i not cancelled in s} T[n][i][j][k]
+    #   P_s[n] = cost(N_s[n])
+    # and the objective is the average over the scenarios of the profit of
+    # the orders done minus the payments.
+    from solver import load_payment_constraints
+
+    orders_vars = variables['orders']
+    worker_vars = variables['worker']
+    scenarios = len(cancelled)
+    kept = 1.0 - cancelled.mean(axis=0)
+    profits = data.profits.tolist()
+
+    my_problem.objective.set_linear([
+        (orders_vars[keys[0]][0], float(sum(profits[i] * kept[i] for i, _, _ in keys)))
+        for _, keys in variables['placements'].alive_groups()
+    ])
+    my_problem.objective.set_linear([
+        (list(index)[0], 0.0) for index in variables['payments'].values()])
+
+    worker_orders = defaultdict(list)
+    worker_indices = defaultdict(list)
+    for (n, i, _, _), index in worker_vars.items():
+        worker_orders[n].append(i)
+        worker_indices[n].append(index[0])
+    worker_orders = {n: np.asarray(orders) for n, orders in worker_orders.items()}
+    worker_indices = {n: np.asarray(indices) for n, indices in worker_indices.items()}
+
+    scenario_vars = {'payments': [], 'payments_count': []}
+    c_iter = 0
+    for s in range(scenarios):
+        payments_vars = {}
+        payments_count_vars = {}
+        for n in range(data.number_of_workers):
+            payments_vars[n] = my_problem.variables.add(
+                obj=[-1.0 / scenarios],
+                lb=[0],
+                ub=[cplex.infinity],
+                names=[f'P^{n}_s{s}'] if names else None
+            )
+            payments_count_vars[n] = my_problem.variables.add(
+                obj=[0.0],
+                lb=[0],
+                ub=[data.number_of_orders],
+                types=[my_problem.variables.type.integer],
+                names=[f'N^{n}_s{s}'] if names else None
+            )
+
+            c_iter += 1
+            ind = []
+            if n in worker_orders:
+                ind = worker_indices[n][~cancelled[s, worker_orders[n]]].tolist()
+            my_problem.linear_constraints.add(
+                lin_expr=[cplex.SparsePair(
+                    ind=ind + list(payments_count_vars[n]),
+                    val=[1.0] * len(ind) + [-1.0])],
+                senses=["E"],
+                rhs=[0.0],
+                names=[f'c_scenario_payment_consistency#{c_iter}'] if names else None
+            )
+
+        load_payment_constraints(my_problem, data, payments_vars, payments_count_vars,
+                                 names=names, suffix=f'_s{s}')
+        scenario_vars['payments'].append(payments_vars)
+        scenario_vars['payments_count'].append(payments_count_vars)
+
+    variables['scenarios'] = scenario_vars
+    return scenario_vars
+
+
+def solution_assignments(my_problem, worker_vars) -> dict:
+    # {(order, day, shift): [workers]} of the current solution
+    values = my_problem.solution.get_values()
+    assignments = defaultdict(list)
+    for (n, i, j, k), index in worker_vars.items():
+        if values[index[0]] > 0.5:
+            assignments[i, j, k].append(n)
+    return dict(assignments)
+
+
+def _evaluate_chunk(data, performed: np.ndarray, assigned: np.ndarray,
+                    scenarios: int, seed) -> np.ndarray:
+    # Objective of the schedule in every scenario of the chunk
+    kept = ~sample_cancellations(data, scenarios, np.random.default_rng(seed))
+    kept = kept.astype(np.float64)
+    profit = kept @ (data.profits * performed)
+    loads = kept @ assigned.T
+    return profit - data.payments(loads).sum(axis=1)
+
+
+def evaluate_schedules(data, candidates: dict, scenarios: int = EVALUATION_SCENARIOS,
+                       processes: int = None, seed: int = 42) -> dict:
+    # Evaluates every candidate schedule ({name: {(order, day, shift):
+    # [workers]}}) over the same sampled scenarios, in parallel chunks, and
+    # returns the expected objective, its variance and the worst case
+    chunks = [min(CHUNK_SCENARIOS, scenarios - start)
+              for start in range(0, scenarios, CHUNK_SCENARIOS)]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+
+    jobs = []
+    for name, assignments in candidates.items():
+        performed = np.zeros(data.number_of_orders)
+        assigned = np.zeros((data.number_of_workers, data.number_of_orders))
+        for (i, _, _), workers in assignments.items():
+            performed[i] = 1.0
+            assigned[workers, i] = 1.0
+        jobs += [(name, performed, assigned, size, chunk_seed)
+                 for size, chunk_seed in zip(chunks, seeds)]
+
+    with ProcessPoolExecutor(max_workers=processes or os.cpu_count()) as pool:
+        results = pool.map(_evaluate_chunk,
+                           [data] * len(jobs),
+                           *[[job[position] for job in jobs] for position in range(1, 5)])
+        objectives = defaultdict(list)
+        for job, values in zip(jobs, results):
+            objectives[job[0]].append(values)
+
+    evaluation = {}
+    for name, values in objectives.items():
+        values = np.concatenate(values)
+        evaluation[name] = {
+            'scenarios': len(values),
+            'expected': float(values.mean()),
+            'variance': float(values.var(ddof=1)) if len(values) > 1 else 0.0,
+            'worst': float(values.min()),
+            'percentile_5': float(np.percentile(values, 5)),
+        }
+    return evaluation
+
+
+def print_evaluation(evaluation: dict) -> None:
+    for name, stats in evaluation.items():
+        print(f'{name}: expected objective {stats["expected"]:.1f} over '
+              f'{stats["scenarios"]} scenarios (variance {stats["variance"]:.1f}, '
+              f'std {np.sqrt(stats["variance"]):.1f}, 5% percentile '
+              f'{stats["percentile_5"]:.1f}, worst {stats["worst"]:.1f})')
@@ -0,0 +1,406 @@
+import cplex
+import functools
+import numpy as np
+import operator
+import os
+
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from utils.sequential_chains import OrderPlacements
+from utils.verifier import verify_schedule
+
+
+# Same limits as the monolithic model (c_alphas, c_worker_shift and
+# c_workers_difference)
+MAX_WORKING_DAYS = 5
+MAX_SHIFTS_PER_DAY = 4
+MAX_ORDERS_DIFFERENCE = 10
+# Outcome of a day assignment
+FEASIBLE, INFEASIBLE, UNKNOWN = 'feasible', 'infeasible', 'unknown'
+
+
+def _quiet_problem(name: str):
+    my_problem = cplex.Cplex()
+    my_problem.set_problem_name(name)
+    my_problem.set_log_stream(None)
+    my_problem.set_results_stream(None)
+    my_problem.set_warning_stream(None)
+    return my_problem
+
+
+def rest_days(data) -> np.ndarray:
+    # Boolean (workers, days) mask of the days off of every worker, spread
+    # round robin so the daily capacity stays even. With them, no worker can
+    # exceed MAX_WORKING_DAYS whatever the per-day assignments are.
+    days_off = max(0, data.number_of_days - MAX_WORKING_DAYS)
+    resting = np.zeros((data.number_of_workers, data.number_of_days), dtype=bool)
+    for n in range(data.number_of_workers):
+        for r in range(days_off):
+            resting[n, (n + r) % data.number_of_days] = True
+    return resting
+
+
+def build_placement_model(data, placements, working):
+    # Stage one: which order is done on which (day, shift), over the placement
+    # groups only, with the aggregate worker capacity of every shift and day.
+    my_problem = _quiet_problem('field_service_placement')
+    my_problem.objective.set_sense(my_problem.objective.sense.maximize)
+
+    workers_needed = data.workers_needed.tolist()
+    profits = data.profits.tolist()
+    eligible = data.eligibility_mask() & working.T[None, :, None, :]
+    staffed = eligible.sum(axis=3) >= data.workers_needed[:, None, None]
+
+    group_vars = {}
+    for group, keys in placements.alive_groups():
+        if not all(staffed[key] for key in keys):
+            continue
+        order, day, shift = keys[0]
+        group_vars[group] = my_problem.variables.add(
+            obj=[float(sum(profits[key[0]] for key in keys))],
+            lb=[0],
+            ub=[1],
+            types=[my_problem.variables.type.binary],
+            names=[f'O_{order}_{day}_{shift}']
+        )[0]
+
+    by_order = defaultdict(list)
+    by_shift = defaultdict(list)
+    for group, index in group_vars.items():
+        for i, j, k in placements.groups[group]:
+            by_order[i].append(index)
+            by_shift[j, k].append((index, workers_needed[i], _worker_set(eligible[i, j, k])))
+
+    # constraint: each order is done at most once in the week
+    for i, ind in by_order.items():
+        my_problem.linear_constraints.add(
+            lin_expr=[cplex.SparsePair(ind=ind, val=[1.0] * len(ind))],
+            senses=["L"], rhs=[1.0], names=[f'c_order#{i}'])
+
+    # constraint: for every eligibility class C (the workers of a placement,
+    # or all the workers on duty), the workers needed by the placements that
+    # only C can staff never exceed |C| on a shift, nor the shifts C can do
+    # on a day
+    for j in range(data.number_of_days):
+        day_keys = []
+        for k in range(data.number_of_shifts):
+            keys = by_shift.get((j, k), [])
+            day_keys += keys
+            for c, workers in enumerate(_eligibility_classes(keys)):
+                add_class_capacity(my_problem, keys, workers, 1,
+                                   f'c_shift_capacity#{j}_{k}_{c}')
+        for c, workers in enumerate(_eligibility_classes(day_keys)):
+            add_class_capacity(my_problem, day_keys, workers, MAX_SHIFTS_PER_DAY,
+                               f'c_day_capacity#{j}_{c}')
+
+    # Payment estimate: balanced over the W workers, the total payment of X
+    # assigned orders is W * cost(X / W), the lowest possible for convex tiers
+    add_payment_estimate(my_problem, data, [
+        (index, float(sum(workers_needed[key[0]] for key in placements.groups[group])))
+        for group, index in group_vars.items()
+    ])
+    return my_problem, group_vars
+
+
+def _worker_set(mask: np.ndarray) -> int:
+    # Set of workers as a bit mask, so subsets are checked with integer ops
+    return sum(1 << n for n in np.flatnonzero(mask).tolist())
+
+
+def _eligibility_classes(keys: list) -> list:
+    # Distinct worker sets of the placements plus their union
+    classes = {workers for _, _, workers in keys}
+    if classes:
+        classes.add(functools.reduce(operator.or_, classes))
+    return sorted(classes)
+
+
+def add_class_capacity(my_problem, keys: list, workers: int, slots: int, name: str) -> None:
+    terms = defaultdict(float)
+    for index, needed, eligible in keys:
+        if eligible & ~workers == 0:
+            terms[index] += needed
+    capacity = slots * bin(workers).count('1')
+    if sum(terms.values()) <= capacity:
+        return
+    my_problem.linear_constraints.add(
+        lin_expr=[cplex.SparsePair(ind=list(terms), val=list(terms.values()))],
+        senses=["L"], rhs=[float(capacity)], names=[name])
+
+
+def add_payment_estimate(my_problem, data, terms) -> None:
+    breakpoints, costs = data.payment_breakpoints()
+    rates = data.payment_tier_rates.tolist()
+    workers = data.number_of_workers
+    payment = my_problem.variables.add(obj=[-1.0], lb=[0], ub=[cplex.infinity],
+                                       names=['P_total'])[0]
+    if not all(low <= high for low, high in zip(rates, rates[1:])):
+        # Not convex: the first tier is used as a linear estimate
+        breakpoints, costs, rates = [0.0], [0.0], [min(rates)]
+    for m, (breakpoint, cost, rate) in enumerate(zip(breakpoints, costs, rates)):
+        # P \geq W (c_m + rate_m (X / W - b_m))
+        my_problem.linear_constraints.add(
+            lin_expr=[cplex.SparsePair(
+                ind=[payment] + [t[0] for t in terms],
+                val=[1.0] + [-rate * t[1] for t in terms])],
+            senses=["G"], rhs=[workers * (cost - rate * breakpoint)],
+            names=[f'c_payment_estimate#{m}'])
+
+
+def day_problems(data, placed: dict, working: np.ndarray, placements) -> dict:
+    # Stage two input: one plain (picklable) problem per day with the orders
+    # placed on it and the workers that can be assigned to each of them
+    problems = {}
+    for j in range(data.number_of_days):
+        day_placed = sorted((i, k) for (i, day, k) in placed if day == j)
+        if not day_placed:
+            continue
+        groups = defaultdict(list)
+        for i, k in day_placed:
+            groups[placements.group_of[i, j, k]].append((i, k))
+        problems[j] = {
+            'day': j,
+            'placed': day_placed,
+            # placements done together (sequential chains), with their profit
+            'groups': [(keys, float(sum(data.profits[i] for i, _ in keys)))
+                       for keys in groups.values()],
+            'workers_needed': {i: int(data.workers_needed[i]) for i, _ in day_placed},
+            'eligible': {
+                (i, k): [n for n in data.eligible_workers(i, j, k).tolist() if working[n, j]]
+                for i, k in day_placed
+            },
+            'next_shift_pairs': data.non_consecutive_pairs.tolist()
+            + data.repetitive_pairs.tolist(),
+            'conflicting_workers': data.conflicting_worker_pairs.tolist(),
+            'number_of_workers': data.number_of_workers,
+        }
+    return problems
+
+
+def solve_day_assignment(problem: dict, time_limit: float = 60.0, optional: bool = False):
+    # Stage two: assigns workers to the orders placed on a single day,
+    # balancing the load of the day (which, with convex tiers, also keeps the
+    # weekly payments low). problem['caps'] optionally bounds the orders of
+    # some workers on the day. With optional, placements may be dropped and the
+    # profit of the ones staffed is maximized first. Returns (status,
+    # {(i, k): [workers]}): status is FEASIBLE, INFEASIBLE when proven, or
+    # UNKNOWN when the time limit is hit without a solution.
+    my_problem = _quiet_problem(f'field_service_day_{problem["day"]}')
+    my_problem.parameters.threads.set(1)
+    my_problem.parameters.timelimit.set(time_limit)
+
+    assignment_vars = {}
+    for (i, k), workers in problem['eligible'].items():
+        for n in workers:
+            assignment_vars[n, i, k] = my_problem.variables.add(
+                lb=[0], ub=[1], types=[my_problem.variables.type.binary],
+                names=[f'T^{n}_{i}_{problem["day"]}_{k}'])[0]
+    max_load = my_problem.variables.add(obj=[1.0], lb=[0], ub=[MAX_SHIFTS_PER_DAY],
+                                        names=['max_load'])[0]
+
+    by_worker = defaultdict(list)
+    by_worker_shift = defaultdict(list)
+    for (n, i, k), index in assignment_vars.items():
+        by_worker[n].append(index)
+        by_worker_shift[n, k].append(index)
+
+    # staffed[i, k] is 1 or, with optional, the variable of its group
+    staffed = {}
+    for keys, profit in problem['groups']:
+        index = None
+        if optional:
+            index = my_problem.variables.add(
+                obj=[-(MAX_SHIFTS_PER_DAY + 1) * profit], lb=[0], ub=[1],
+                types=[my_problem.variables.type.binary],
+                names=[f'O_{keys[0][0]}_{problem["day"]}_{keys[0][1]}'])[0]
+        for key in keys:
+            staffed[key] = index
+
+    for i, k in problem['placed']:
+        ind = [assignment_vars[n, i, k] for n in problem['eligible'][i, k]]
+        needed = float(problem['workers_needed'][i])
+        if staffed[i, k] is None:
+            my_problem.linear_constraints.add(
+                lin_expr=[cplex.SparsePair(ind=ind, val=[1.0] * len(ind))],
+                senses=["E"], rhs=[needed])
+        else:
+            my_problem.linear_constraints.add(
+                lin_expr=[cplex.SparsePair(ind=ind + [staffed[i, k]],
+                                           val=[1.0] * len(ind) + [-needed])],
+                senses=["E"], rhs=[0.0])
+    for ind in by_worker_shift.values():
+        my_problem.linear_constraints.add(
+            lin_expr=[cplex.SparsePair(ind=ind, val=[1.0] * len(ind))],
+            senses=["L"], rhs=[1.0])
+    for ind in by_worker.values():
+        my_problem.linear_constraints.add(
+            lin_expr=[cplex.SparsePair(ind=ind + [max_load],
+                                       val=[1.0] * len(ind) + [-1.0])],
+            senses=["L"], rhs=[0.0])
+    for n, cap in problem.get('caps', {}).items():
+        if n in by_worker:
+            my_problem.linear_constraints.add(
+                lin_expr=[cplex.SparsePair(ind=by_worker[n], val=[1.0] * len(by_worker[n]))],
+                senses=["L"], rhs=[float(cap)])
+
+    placed = set(problem['placed'])
+    for order_a, order_b in problem['next_shift_pairs']:
+        for _, k in [p for p in problem['placed'] if p[0] == order_a]:
+            if (order_b, k + 1) not in placed:
+                continue
+            for n in range(problem['number_of_workers']):
+                if (n, order_a, k) in assignment_vars and (n, order_b, k + 1) in assignment_vars:
+                    my_problem.linear_constraints.add(
+                        lin_expr=[cplex.SparsePair(
+                            ind=[assignment_vars[n, order_a, k],
+                                 assignment_vars[n, order_b, k + 1]],
+                            val=[1.0, 1.0])],
+                        senses=["L"], rhs=[1.0])
+    for worker_a, worker_b in problem['conflicting_workers']:
+        for i, k in problem['placed']:
+            if (worker_a, i, k) in assignment_vars and (worker_b, i, k) in assignment_vars:
+                my_problem.linear_constraints.add(
+                    lin_expr=[cplex.SparsePair(
+                        ind=[assignment_vars[worker_a, i, k],
+                             assignment_vars[worker_b, i, k]],
+                        val=[1.0, 1.0])],
+                    senses=["L"], rhs=[1.0])
+
+    my_problem.solve()
+    if my_problem.solution.get_solution_type() == my_problem.solution.type.none:
+        status = my_problem.solution.get_status()
+        infeasible = status in (my_problem.solution.status.MIP_infeasible,
+                                my_problem.solution.status.MIP_infeasible_or_unbounded)
+        return (INFEASIBLE if infeasible else UNKNOWN), {}
+    values = my_problem.solution.get_values()
+    assignment = defaultdict(list)
+    for (n, i, k), index in assignment_vars.items():
+        if values[index] > 0.5:
+            assignment[i, k].append(n)
+    return FEASIBLE, dict(assignment)
+
+
+def solve_two_stage(data, impossible_orders=(), max_iterations: int = 20,
+                    processes: int = None, time_limit: float = 60.0) -> dict:
+    # Hierarchical solve: placements first, then independent per-day worker
+    # assignments in parallel. A day proven impossible to staff adds a no-good
+    # cut on its set of placements to stage one, which is solved again. Days
+    # still without assignments at the end (not converged, or time limit) are
+    # solved dropping the placements that cannot be staffed.
+    working = ~rest_days(data)
+    placements = OrderPlacements(data, impossible_orders)
+    placement_problem, group_vars = build_placement_model(data, placements, working)
+    solved_days = {}
+
+    with ProcessPoolExecutor(max_workers=processes or os.cpu_count()) as pool:
+        for iteration in range(max_iterations):
+            placement_problem.solve()
+            values = placement_problem.solution.get_values()
+            placed = {key for group, index in group_vars.items() if values[index] > 0.5
+                      for key in placements.groups[group]}
+
+            problems = day_problems(data, placed, working, placements)
+            pending = {j: problem for j, problem in problems.items()
+                       if tuple(problem['placed']) not in solved_days.get(j, {})}
+            results = pool.map(solve_day_assignment, pending.values(),
+                               [time_limit] * len(pending))
+            for j, result in zip(pending, results):
+                solved_days.setdefault(j, {})[tuple(pending[j]['placed'])] = result
+
+            days = {j: solved_days[j][tuple(problem['placed'])]
+                    for j, problem in problems.items()}
+            infeasible = [j for j, (status, _) in days.items() if status == INFEASIBLE]
+            if not infeasible:
+                break
+            if iteration == max_iterations - 1:
+                print(f'Two-stage solve did not converge in {max_iterations} iterations')
+                break
+            for j in infeasible:
+                # no-good cut: this set of placements cannot be staffed
+                ind = sorted({group_vars[placements.group_of[i, j, k]]
+                              for i, k in problems[j]['placed']})
+                placement_problem.linear_constraints.add(
+                    lin_expr=[cplex.SparsePair(ind=ind, val=[1.0] * len(ind))],
+                    senses=["L"], rhs=[len(ind) - 1.0],
+                    names=[f'c_day_cut#{iteration}_{j}'])
+            print(f'Two-stage iteration {iteration + 1}: days {infeasible} '
+                  f'could not be staffed, re-solving placements')
+
+        unsolved = [j for j, (status, _) in days.items() if status != FEASIBLE]
+        if unsolved:
+            print(f'Two-stage: dropping the placements that cannot be staffed '
+                  f'on days {unsolved}')
+            results = pool.map(solve_day_assignment, [problems[j] for j in unsolved],
+                               [time_limit] * len(unsolved), [True] * len(unsolved))
+            days.update(zip(unsolved, results))
+
+        balance_weekly_loads(data, problems, days, pool, time_limit, max_iterations)
+
+    assignments = {
+        (i, j, k): workers
+        for j, (_, assignment) in days.items()
+        for (i, k), workers in assignment.items()
+    }
+    report = verify_schedule(data, assignment_tensor(data, assignments))
+    if not report.is_valid:
+        print('Warning: the two-stage schedule breaks rules of the full model')
+        report.print_report()
+    return {
+        'assignments': assignments,
+        'objective': schedule_objective(data, assignments),
+        'iterations': iteration + 1,
+        'valid': report.is_valid,
+    }
+
+
+def balance_weekly_loads(data, problems: dict, days: dict, pool, time_limit: float,
+                         max_iterations: int = 20) -> None:
+    # Days are assigned independently, so the weekly rule
+    # N_max - N_min \leq MAX_ORDERS_DIFFERENCE is enforced afterwards: the
+    # workers above N_min + MAX_ORDERS_DIFFERENCE get a lower cap on their
+    # busiest days, which are solved again (dropping placements if needed)
+    # until the rule holds. Caps only decrease, so this ends.
+    caps = np.full((data.number_of_workers, data.number_of_days), MAX_SHIFTS_PER_DAY)
+    for _ in range(max_iterations):
+        loads = np.zeros((data.number_of_workers, data.number_of_days), dtype=int)
+        for j, (_, assignment) in days.items():
+            for workers in assignment.values():
+                loads[workers, j] += 1
+        totals = loads.sum(axis=1)
+        excess = totals - (totals.min() + MAX_ORDERS_DIFFERENCE)
+        if excess.max() <= 0:
+            return
+
+        capped = set()
+        for n in np.flatnonzero(excess > 0).tolist():
+            caps[n] = np.minimum(caps[n], loads[n])
+            for _ in range(excess[n]):
+                j = int(caps[n].argmax())
+                caps[n, j] -= 1
+                capped.add(j)
+        capped = sorted(capped)
+        for j in capped:
+            problems[j]['caps'] = {n: int(caps[n, j]) for n in range(data.number_of_workers)
+                                   if caps[n, j] < MAX_SHIFTS_PER_DAY}
+        results = pool.map(solve_day_assignment, [problems[j] for j in capped],
+                           [time_limit] * len(capped), [True] * len(capped))
+        days.update(zip(capped, results))
+
+
+def assignment_tensor(data, assignments: dict) -> np.ndarray:
+    # (workers, orders, days, shifts) boolean tensor of the verifier
+    schedule = np.zeros((data.number_of_workers, data.number_of_orders,
+                         data.number_of_days, data.number_of_shifts), dtype=bool)
+    for (i, j, k), workers in assignments.items():
+        schedule[workers, i, j, k] = True
+    return schedule
+
+
+def schedule_objective(data, assignments: dict) -> float:
+    # Profit of the performed orders minus the tiered payment of every worker
+    loads = np.zeros(data.number_of_workers)
+    for workers in assignments.values():
+        loads[workers] += 1
+    profit = sum(float(data.profits[i]) for i, _, _ in assignments)
+    return profit - float(data.payments(loads).sum())
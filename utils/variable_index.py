@@ -0,0 +1,54 @@
+import numpy as np
+
+
+class VariableIndex():
+    # Maps the (worker, order, day, shift) or (order, day, shift) keys of a
+    # variable family to their CPLEX indices with a dense numpy array (-1 for
+    # the keys without variable) instead of one Python object per variable.
+    #
+    # It behaves like the dicts of ranges used in the model: `key in index`,
+    # `index[key]` (a one element range), `len`, `items` and `values`, in the
+    # lexicographic order of the keys.
+    def __init__(self, indices: np.ndarray) -> None:
+        self.indices = indices
+        self.shape = indices.shape
+
+    @classmethod
+    def from_mask(cls, mask: np.ndarray, first_index: int):
+        # Consecutive indices, starting at first_index, for the True entries
+        # of the mask (the order in which the variables are added)
+        indices = np.full(mask.shape, -1, dtype=np.int64)
+        indices[mask] = first_index + np.arange(int(mask.sum()), dtype=np.int64)
+        return cls(indices)
+
+    def __contains__(self, key) -> bool:
+        return self.indices[key] >= 0
+
+    def __getitem__(self, key) -> range:
+        index = int(self.indices[key])
+        if index < 0:
+            raise KeyError(key)
+        return range(index, index + 1)
+
+    def __len__(self) -> int:
+        return int((self.indices >= 0).sum())
+
+    def __iter__(self):
+        for key, _ in self.items():
+            yield key
+
+    def keys(self):
+        return iter(self)
+
+    def items(self, chunk_size: int = 100000):
+        # Yields (key, range) without materializing every key at once
+        flat = np.flatnonzero(self.indices >= 0)
+        for start in range(0, len(flat), chunk_size):
+            chunk = flat[start:start + chunk_size]
+            keys = np.stack(np.unravel_index(chunk, self.shape), axis=1).tolist()
+            for key, index in zip(keys, self.indices.flat[chunk].tolist()):
+                yield tuple(key), range(index, index + 1)
+
+    def values(self):
+        for _, index in self.items():
+            yield index
@@ -0,0 +1,195 @@
+import numpy as np
+import srsly
+
+from collections import defaultdict
+from pathlib import Path
+
+
+# Schedule files written by parse_results / write_assignments. The orders
+# file uses 0-based order and worker ids, the workers file 1-based ones.
+ORDERS_SCHEDULE = 'orders_schedule.json'
+WORKER_SCHEDULE = 'worker_schedule.json'
+# Violations printed per rule
+MAX_PRINTED = 10
+
+
+class VerificationReport():
+    def __init__(self) -> None:
+        # rule -> list of violations
+        self.violations = defaultdict(list)
+        self.profit = 0.0
+        self.payments = 0.0
+
+    def add(self, rule: str, message: str) -> None:
+        self.violations[rule].append(message)
+
+    @property
+    def is_valid(self) -> bool:
+        return not self.violations
+
+    @property
+    def objective(self) -> float:
+        return self.profit - self.payments
+
+    def print_report(self) -> None:
+        print(f'Profit: {self.profit:.1f}, payments: {self.payments:.1f}, '
+              f'objective: {self.objective:.1f}')
+        if self.is_valid:
+            print('Verification: every rule is satisfied')
+            return
+        print(f'Verification: {sum(map(len, self.violations.values()))} violation(s)')
+        for rule, messages in self.violations.items():
+            print(f'    {rule}: {len(messages)} violation(s)')
+            for message in messages[:MAX_PRINTED]:
+                print(f'        {message}')
+
+
+def _empty_schedule(data) -> np.ndarray:
+    return np.zeros((data.number_of_workers, data.number_of_orders,
+                     data.number_of_days, data.number_of_shifts), dtype=bool)
+
+
+def _assign(data, schedule, report, source, worker, order, day, shift) -> None:
+    # day and shift come 1-based from the files
+    key = (worker, order, day - 1, shift - 1)
+    if all(0 <= value < size for value, size in zip(key, schedule.shape)):
+        schedule[key] = True
+    else:
+        report.add('format', f'{source}: worker_{worker} order_{order} '
+                             f'day {day} shift {shift} out of range')
+
+
+def read_orders_schedule(data, path: Path, report: VerificationReport) -> np.ndarray:
+    # (workers, orders, days, shifts) assignment tensor of orders_schedule.json
+    schedule = _empty_schedule(data)
+    for order, row in srsly.read_json(path).items():
+        i = int(order.split('_')[1])
+        if 0 <= i < data.number_of_orders and \
+                row['workers_needed'] != int(data.workers_needed[i]):
+            report.add('format', f'{order}: workers_needed is {row["workers_needed"]}, '
+                                 f'the instance needs {int(data.workers_needed[i])}')
+        for worker in row['workers_involved']:
+            _assign(data, schedule, report, ORDERS_SCHEDULE,
+                    int(worker.split('_')[1]), i, row['day'], row['shift'])
+    return schedule
+
+
+def read_worker_schedule(data, path: Path, report: VerificationReport) -> np.ndarray:
+    schedule = _empty_schedule(data)
+    for worker, orders in srsly.read_json(path).items():
+        for order, row in orders.items():
+            _assign(data, schedule, report, WORKER_SCHEDULE,
+                    int(worker) - 1, int(order.split('_')[1]) - 1, row['day'], row['shift'])
+    return schedule
+
+
+def read_schedule_pair(data, results_path: Path, report: VerificationReport) -> np.ndarray:
+    # Reads both files of a results folder and reports the assignments found
+    # in only one of them. Rules are then checked on all the assignments.
+    results_path = Path(results_path)
+    orders = read_orders_schedule(data, results_path/ORDERS_SCHEDULE, report)
+    if not (results_path/WORKER_SCHEDULE).exists():
+        return orders
+    workers = read_worker_schedule(data, results_path/WORKER_SCHEDULE, report)
+    for n, i, j, k in np.argwhere(orders != workers).tolist():
+        missing = WORKER_SCHEDULE if orders[n, i, j, k] else ORDERS_SCHEDULE
+        report.add('files', f'worker_{n} order_{i} day {j+1} shift {k+1} '
+                            f'missing in {missing}')
+    return orders | workers
+
+
+def schedule_objective(data, schedule: np.ndarray) -> tuple:
+    # Profit of the performed orders and tiered payments of the workers
+    performed = schedule.any(axis=(0, 2, 3))
+    loads = schedule.sum(axis=(1, 2, 3))
+    return float(data.profits[performed].sum()), float(data.payments(loads).sum())
+
+
+def verify_schedule(data, schedule: np.ndarray, report: VerificationReport = None):
+    # Checks every rule of the model on the assignment tensor. The names of
+    # the rules are the ones of the constraints in solver.load_constraints.
+    report = report or VerificationReport()
+    placed = schedule.any(axis=0)
+    staffed = schedule.sum(axis=0)
+    loads = schedule.sum(axis=(1, 2, 3))
+
+    for i in np.flatnonzero(placed.sum(axis=(1, 2)) > 1).tolist():
+        report.add('c_order', f'order_{i} is done {int(placed[i].sum())} times')
+
+    wrong = placed & (staffed != data.workers_needed[:, None, None])
+    for i, j, k in np.argwhere(wrong).tolist():
+        report.add('c_workers_needed', f'order_{i} day {j+1} shift {k+1} has '
+                                       f'{staffed[i, j, k]} of {data.workers_needed[i]} workers')
+
+    for n, j, k in np.argwhere(schedule.sum(axis=1) > 1).tolist():
+        report.add('c_worker_load', f'worker_{n} has several orders on day {j+1} shift {k+1}')
+
+    for n, j in np.argwhere(schedule.sum(axis=(1, 3)) > 4).tolist():
+        report.add('c_worker_shift', f'worker_{n} works more than 4 shifts on day {j+1}')
+
+    working_days = schedule.any(axis=(1, 3)).sum(axis=1)
+    for n in np.flatnonzero(working_days > 5).tolist():
+        report.add('c_alphas', f'worker_{n} works {working_days[n]} days')
+
+    if len(loads) and loads.max() - loads.min() > 10:
+        report.add('c_workers_difference',
+                   f'worker_{loads.argmax()} has {loads.max()} orders and '
+                   f'worker_{loads.argmin()} {loads.min()}')
+
+    # Sequential pairs: i2 is done on the shift right after i1 and only then
+    first, second = data.sequential_pairs[:, 0], data.sequential_pairs[:, 1]
+    broken = placed[first, :, :-1] != placed[second, :, 1:]
+    for p, j, k in np.argwhere(broken).tolist():
+        report.add('c_seq_pairs', f'order_{first[p]} (shift {k+1}) and order_{second[p]} '
+                                  f'(shift {k+2}) are not both done on day {j+1}')
+    for p, j in np.argwhere(placed[first, :, -1]).tolist():
+        report.add('c_seq_pairs', f'order_{first[p]} is done on the last shift of '
+                                  f'day {j+1}, so order_{second[p]} cannot follow it')
+
+    # Pairs that the same worker cannot do in consecutive shifts
+    for rule, pairs in [('c_nonseq_pairs', data.non_consecutive_pairs),
+                        ('c_ro_pairs', data.repetitive_pairs)]:
+        both = schedule[:, pairs[:, 0], :, :-1] & schedule[:, pairs[:, 1], :, 1:]
+        for n, p, j, k in np.argwhere(both).tolist():
+            report.add(rule, f'worker_{n} does order_{pairs[p, 0]} and order_{pairs[p, 1]} '
+                             f'on shifts {k+1} and {k+2} of day {j+1}')
+
+    pairs = data.conflicting_worker_pairs
+    together = schedule[pairs[:, 0]] & schedule[pairs[:, 1]]
+    for p, i, j, k in np.argwhere(together).tolist():
+        report.add('c_cw_pairs', f'worker_{pairs[p, 0]} and worker_{pairs[p, 1]} share '
+                                 f'order_{i} on day {j+1} shift {k+1}')
+
+    ineligible = schedule & ~data.eligibility_mask().transpose(3, 0, 1, 2)
+    for n, i, j, k in np.argwhere(ineligible).tolist():
+        report.add('eligibility', f'worker_{n} cannot do order_{i} on day {j+1} shift {k+1}')
+
+    report.profit, report.payments = schedule_objective(data, schedule)
+    return report
+
+
+def diff_schedules(data, schedule: np.ndarray, reference: np.ndarray) -> dict:
+    # Orders only done in one of the schedules, done at another slot or by
+    # other workers, and the objective of both
+    placed, reference_placed = schedule.any(axis=0), reference.any(axis=0)
+    done, reference_done = placed.any(axis=(1, 2)), reference_placed.any(axis=(1, 2))
+    both = done & reference_done
+    moved = both & (placed != reference_placed).any(axis=(1, 2))
+    reassigned = both & ~moved & (schedule != reference).any(axis=(0, 2, 3))
+    profit, payments = schedule_objective(data, schedule)
+    reference_profit, reference_payments = schedule_objective(data, reference)
+    return {
+        'only_in_schedule': np.flatnonzero(done & ~reference_done).tolist(),
+        'only_in_reference': np.flatnonzero(reference_done & ~done).tolist(),
+        'moved': np.flatnonzero(moved).tolist(),
+        'reassigned': np.flatnonzero(reassigned).tolist(),
+        'objective': profit - payments,
+        'reference_objective': reference_profit - reference_payments,
+    }
+
+
+def print_diff(diff: dict) -> None:
+    print(f'Objective: {diff["objective"]:.1f} (reference {diff["reference_objective"]:.1f})')
+    for key in ['only_in_schedule', 'only_in_reference', 'moved', 'reassigned']:
+        print(f'    {key.replace("_", " ")}: {len(diff[key])} order(s) '
+              f'{["order_" + str(i) for i in diff[key]][:MAX_PRINTED]}')